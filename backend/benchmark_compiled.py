@@ -0,0 +1,83 @@
+"""
+Script to benchmark the compiled tree evaluator against the pickled XGBoost
+models on real players: per-model numerical agreement, latency at several
+batch sizes and an end-to-end check of the nine-year simulation.
+
+Usage: python benchmark_compiled.py [limit]
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+import predictor
+from predictor import MODEL_TASKS, toModelMatrix, predictNineYears, setModelBackend, getCompiledModels, PREDICTION_CACHE
+from benchmark_predictor import load_players, count_mismatches
+
+BATCH_SIZES = (1, 4, 16, 64, 256)
+
+
+def compare_predictions(X):
+    """Max absolute difference and number of differing values per model"""
+    setModelBackend('xgboost')
+    expected = predictor._predictAllTasks(X)
+    actual = getCompiledModels().predict(X, MODEL_TASKS)
+    print(f"{'Model':<22}{'max abs diff':>14}{'differing':>11}")
+    differing = 0
+    for task_name in MODEL_TASKS:
+        diff = np.abs(actual[task_name].astype(float) - expected[task_name])
+        count = int((actual[task_name] != expected[task_name]).sum())
+        differing += count
+        print(f"{task_name:<22}{diff.max():>14.3g}{count:>11}")
+    return differing
+
+
+def time_call(fn, repeat):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def time_backends(X):
+    """Latency of running all 16 models over batches of each size"""
+    compiled = getCompiledModels()
+    setModelBackend('xgboost')
+    print(f"{'Rows':>6}{'xgboost ms':>13}{'compiled ms':>13}{'speedup':>9}")
+    for size in BATCH_SIZES:
+        batch = X[:size]
+        if len(batch) < size:
+            break
+        repeat = max(5, 200 // size)
+        xgboost_ms = time_call(lambda: predictor._predictAllTasks(batch), repeat)
+        compiled_ms = time_call(lambda: compiled.predict(batch, MODEL_TASKS), repeat)
+        print(f"{size:>6}{xgboost_ms:>13.2f}{compiled_ms:>13.2f}{xgboost_ms / compiled_ms:>8.1f}x")
+
+
+def run_benchmark(limit=200):
+    players, features = load_players(limit)
+    X = toModelMatrix(pd.concat(features, ignore_index=True))
+    print(f"Loaded {len(players)} players")
+
+    print("-" * 60)
+    differing = compare_predictions(X)
+    print("-" * 60)
+    time_backends(X)
+    print("-" * 60)
+
+    results = {}
+    for backend in ('xgboost', 'compiled'):
+        setModelBackend(backend)
+        PREDICTION_CACHE.clear()
+        start = time.perf_counter()
+        results[backend] = [predictNineYears(df, p) for df, p in zip(features, players)]
+        elapsed = time.perf_counter() - start
+        print(f"predictNineYears ({backend}): {elapsed / len(players) * 1000:.1f} ms/player")
+    print(f"Mismatched simulation values: {count_mismatches(results['xgboost'], results['compiled'])}")
+    print(f"Differing model outputs: {differing}")
+    print("-" * 60)
+
+
+if __name__ == "__main__":
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    run_benchmark(limit)
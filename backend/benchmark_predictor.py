@@ -0,0 +1,69 @@
+"""
+Script to benchmark the prediction engine against real players.
+Checks that the batched simulation matches the per-player path exactly
+and reports how long each one takes under every inference mode.
+
+Usage: python benchmark_predictor.py [limit]
+"""
+import sys
+import time
+import pandas as pd
+from sqlmodel import Session, select
+from database import engine
+from models import Player
+from model_utils import player_to_features
+from predictor import predictNineYears, predictNineYearsBatch, configureInference, INFERENCE_MODES, PREDICTION_CACHE
+
+
+def load_players(limit):
+    """Fetch `limit` players and their feature rows"""
+    with Session(engine) as session:
+        players = session.exec(select(Player).order_by(Player.id).limit(limit)).all()
+        features = [player_to_features(p) for p in players]
+        session.expunge_all()
+    return players, features
+
+
+def count_mismatches(expected, actual):
+    """Count metric values that differ between two lists of statsLibraries"""
+    mismatches = 0
+    for lib_a, lib_b in zip(expected, actual):
+        for year_a, year_b in zip(lib_a, lib_b):
+            for key in set(year_a) | set(year_b):
+                if year_a.get(key) != year_b.get(key):
+                    mismatches += 1
+    return mismatches
+
+
+def run_benchmark(limit=200):
+    players, features = load_players(limit)
+    batch_features = pd.concat(features, ignore_index=True)
+    print(f"Loaded {len(players)} players")
+
+    for mode in INFERENCE_MODES:
+        configureInference(mode=mode)
+        # Warm the executor so pool start-up isn't counted
+        predictNineYears(features[0], players[0])
+        # Time real simulations, not cache hits from the previous mode
+        PREDICTION_CACHE.clear()
+
+        start = time.perf_counter()
+        scalar = [predictNineYears(df, p) for df, p in zip(features, players)]
+        scalar_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch = predictNineYearsBatch(batch_features, players)
+        batch_time = time.perf_counter() - start
+
+        print("-" * 60)
+        print(f"Mode: {mode}")
+        print(f"Scalar: {scalar_time:.2f}s ({scalar_time / len(players) * 1000:.1f} ms/player)")
+        print(f"Batch:  {batch_time:.2f}s ({batch_time / len(players) * 1000:.1f} ms/player)")
+        print(f"Speedup: {scalar_time / batch_time:.1f}x")
+        print(f"Mismatched values: {count_mismatches(scalar, batch)}")
+    print("-" * 60)
+
+
+if __name__ == "__main__":
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    run_benchmark(limit)
@@ -0,0 +1,177 @@
+"""
+Script to check the vectorized rule layer (prediction_rules.py) against the
+scalar rule functions in predictor.py on randomly generated inputs.
+Any mismatch means the two implementations have drifted apart.
+It also checks that the Monte Carlo noise (predictor.residualNoise) leaves
+the uncertainty bands wide, i.e. that they don't collapse to a single value.
+
+Usage: python check_rules.py [samples] [seed]
+"""
+import sys
+import numpy as np
+import pandas as pd
+from model_utils import MODEL_FEATURES
+from simulation_state import SimulationState
+from predictor import (
+    FixOverall, FixMomentum, FixValue, FixAttributes, applyPredictionRules,
+    MODEL_TASKS, resultsToDicts, residualNoise, BAND_PERCENTILES,
+)
+from config import settings
+from prediction_rules import (
+    FixOverallBatch, FixMomentumBatch, FixValueBatch, FixAttributesBatch,
+    applyPredictionRulesBatch, ATTRIBUTE_STATS,
+)
+
+# Values that sit exactly on rule thresholds
+EDGE_CHANGES = [-4, -3, -2, -1, -0.5, -0.2, 0, 0.1, 0.2, 0.5, 0.7, 1, 2, 3, 4]
+POSITIONS = ['FW', 'MF', 'DF', 'GK']
+PLAYER_POSITIONS = ['ST', 'CF, ST', 'LW, RW', 'CAM, CM', 'CM, CDM', 'CB', 'LB, LM', 'GK', 'RM', 'CDM']
+
+
+def random_changes(rng, n):
+    """Mix of continuous rating changes and exact threshold values"""
+    return np.where(rng.random(n) < 0.3, rng.choice(EDGE_CHANGES, n), rng.uniform(-6, 6, n))
+
+
+def report(name, expected, actual):
+    expected = np.asarray(expected, dtype=float)
+    mismatches = int((expected != actual).sum())
+    print(f"{name:<20} {len(expected):>7} cases  {mismatches:>5} mismatches")
+    return mismatches
+
+
+def check_fix_overall(rng, n):
+    current = rng.integers(50, 96, n).astype(float)
+    change = random_changes(rng, n)
+    age = rng.integers(16, 41, n)
+    potential = current + rng.integers(-5, 16, n)
+    expected = [FixOverall(c, ch, int(a), p) for c, ch, a, p in zip(current, change, age, potential)]
+    overall, predictChange = FixOverallBatch(current, change, age, potential)
+    return (report("FixOverall", [e[0] for e in expected], overall)
+            + report("FixOverall (chg)", [e[1] for e in expected], predictChange))
+
+
+def check_fix_momentum(rng, n):
+    momentum = rng.uniform(10, 15, n)
+    change = random_changes(rng, n)
+    ovr = rng.integers(50, 96, n).astype(float)
+    expected = [FixMomentum(m, c, o) for m, c, o in zip(momentum, change, ovr)]
+    predictChange, overall = FixMomentumBatch(momentum, change, ovr)
+    return (report("FixMomentum", [e[1] for e in expected], overall)
+            + report("FixMomentum (chg)", [e[0] for e in expected], predictChange))
+
+
+def check_fix_value(rng, n):
+    age = rng.integers(16, 41, n)
+    value = np.exp(rng.uniform(np.log(1e5), np.log(2.5e8), n))
+    change = np.round(random_changes(rng, n))
+    change = np.where(rng.random(n) < 0.5, change, random_changes(rng, n))
+    predicted = np.trunc(value * rng.uniform(0.3, 2.0, n))
+    overall = rng.integers(55, 96, n).astype(float)
+    expected = [FixValue(int(a), v, c, p, o) for a, v, c, p, o in zip(age, value, change, predicted, overall)]
+    return report("FixValue", expected, FixValueBatch(age, value, change, predicted, overall))
+
+
+def check_fix_attributes(rng, n):
+    ovr = rng.integers(50, 94, n).astype(float)
+    stats = ovr[:, None] + rng.normal(-8, 8, (n, len(ATTRIBUTE_STATS)))
+    fixed, _ = FixAttributesBatch(stats, ovr)
+    mismatches = 0
+    for s_idx, stat in enumerate(ATTRIBUTE_STATS):
+        expected = []
+        for i in range(n):
+            results = {f'predict{s.capitalize()}': float(stats[i, j]) for j, s in enumerate(ATTRIBUTE_STATS)}
+            results['predictOverall'] = float(ovr[i])
+            expected.append(FixAttributes(results, '')[f'predict{stat.capitalize()}'])
+        mismatches += report(f"FixAttributes ({stat[:3]})", expected, fixed[:, s_idx])
+    return mismatches
+
+
+def random_state(rng, n):
+    """SimulationState with plausible random features"""
+    df = pd.DataFrame(rng.uniform(0, 1, (n, len(MODEL_FEATURES))), columns=MODEL_FEATURES)
+    df['age_fifa'] = rng.integers(16, 41, n)
+    df['overall'] = rng.integers(50, 95, n)
+    df['potential'] = df['overall'] + rng.integers(0, 12, n)
+    df['Playing Time_Min'] = np.where(rng.random(n) < 0.3, rng.uniform(0, 900, n), rng.uniform(900, 3400, n))
+    df['rating_momentum'] = np.where(rng.random(n) < 0.2, rng.uniform(10, 14, n), rng.uniform(-8, 9, n))
+    df['value_eur'] = np.exp(rng.uniform(np.log(1e5), np.log(2e8), n))
+    df['pos'] = rng.choice(POSITIONS, n)
+    df['player_positions'] = rng.choice(PLAYER_POSITIONS, n)
+    return SimulationState.fromFrame(df)
+
+
+def check_full_rules(rng, n):
+    state = random_state(rng, n)
+    predictions = random_predictions(rng, state)
+
+    actual = resultsToDicts(*applyPredictionRulesBatch(predictions, state))
+    expected = []
+    for i, row in enumerate(state.rowDicts()):
+        results = {task_name: float(values[i]) for task_name, values in predictions.items()}
+        expected.append(applyPredictionRules(results, row))
+
+    mismatches = 0
+    for key in sorted(expected[0]):
+        mismatches += report(key[:20], [e[key] for e in expected], np.array([a[key] for a in actual], dtype=float))
+    return mismatches
+
+
+def random_predictions(rng, state):
+    """Raw model outputs for every task, spread around the players' current values"""
+    n = len(state)
+    overall = state.column('overall')
+    predictions = {task_name: rng.uniform(0, 3, n) for task_name in MODEL_TASKS}
+    for stat in ATTRIBUTE_STATS:
+        predictions[f'predict{stat.capitalize()}'] = overall + rng.normal(-6, 6, n)
+    predictions['predictOverall'] = overall + rng.normal(0, 2, n)
+    predictions['predictRatingChange'] = random_changes(rng, n)
+    predictions['predictValue'] = state.column('value_eur') * rng.uniform(0.5, 1.8, n)
+    predictions['predictMin'] = rng.uniform(0, 3400, n)
+    predictions['predictPotential'] = state.column('potential') + rng.normal(0, 2, n)
+    return predictions
+
+
+# Share of players whose year-1 band of a metric may be a single value (only
+# a metric pinned at zero or at the 1-99 rating limits should collapse)
+MAX_COLLAPSED_SHARE = 0.10
+
+
+def check_band_width(rng, n, rollouts=200):
+    """
+    Apply residualNoise to the rule results of `rollouts` copies of each
+    player, as one season of predictUncertaintyBands does, and count the
+    players whose p10-p90 band of a metric has zero width.
+    """
+    state = random_state(rng, n)
+    predictions = random_predictions(rng, state)
+    rows = np.tile(np.arange(n), rollouts)
+    perturb = residualNoise(rng, settings.MONTE_CARLO_RATING_SD, settings.MONTE_CARLO_VALUE_SD,
+                            settings.MONTE_CARLO_STATS_SD)
+    results, _ = applyPredictionRulesBatch({k: v[rows] for k, v in predictions.items()}, state.take(rows))
+    results = perturb(results)
+
+    failures = 0
+    for key, values in results.items():
+        bands = np.percentile(values.reshape(rollouts, n), BAND_PERCENTILES, axis=0)
+        collapsed = int((bands[-1] - bands[0] == 0).sum())
+        print(f"{key[:20]:<20} {n:>7} players  {collapsed:>5} collapsed bands")
+        failures += collapsed > MAX_COLLAPSED_SHARE * n
+    return failures
+
+
+def run_checks(samples=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    print("-" * 60)
+    mismatches = (check_fix_overall(rng, samples) + check_fix_momentum(rng, samples)
+                  + check_fix_value(rng, samples) + check_fix_attributes(rng, samples // 4)
+                  + check_full_rules(rng, samples // 4) + check_band_width(rng, samples // 20))
+    print("-" * 60)
+    print("ALL RULES MATCH" if mismatches == 0 else f"{mismatches} MISMATCHES OR COLLAPSED BANDS")
+    return mismatches
+
+
+if __name__ == "__main__":
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    sys.exit(1 if run_checks(samples, seed) else 0)
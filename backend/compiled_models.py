@@ -0,0 +1,193 @@
+"""
+Array-encoded copies of the XGBoost models.
+export_models.py flattens every tree of every model into a handful of NumPy
+arrays and saves them as one .npz file (no pickle). CompiledModels loads that
+file and evaluates all 16 ensembles together with plain NumPy, which avoids
+XGBoost's per-call overhead for single players and small batches.
+"""
+import json
+import time
+import numpy as np
+
+COMPILED_FORMAT_VERSION = 1
+# Rows evaluated per step; bounds the (rows x trees) temporaries to a few MB
+ROW_CHUNK = 256
+
+
+def flatten_booster(booster):
+    """
+    Read one XGBoost booster into per-tree node lists.
+    Returns (trees, base_score) where each tree is a dict of equal-length
+    lists: feature, threshold, left, right, default_left, value.
+    """
+    model = json.loads(booster.save_raw('json'))['learner']
+    objective = model['objective']['name']
+    if objective != 'reg:squarederror':
+        raise ValueError(f"Only reg:squarederror models can be compiled, got {objective}")
+    booster_type = model['gradient_booster']['name']
+    if booster_type != 'gbtree':
+        raise ValueError(f"Only gbtree models can be compiled, got {booster_type}")
+    base_score = float(json.loads(model['learner_model_param']['base_score'])[0])
+
+    trees = []
+    for tree in model['gradient_booster']['model']['trees']:
+        if any(tree['split_type']):
+            raise ValueError("Categorical splits are not supported")
+        trees.append({
+            'feature': tree['split_indices'],
+            'threshold': tree['split_conditions'],
+            'left': tree['left_children'],
+            'right': tree['right_children'],
+            'default_left': tree['default_left'],
+            # Leaves keep their value in split_conditions
+            'value': tree['split_conditions'],
+        })
+    return trees, base_score
+
+
+def _tree_depth(left, right):
+    depth, frontier = 0, [0]
+    while True:
+        frontier = [c for n in frontier if left[n] != -1 for c in (left[n], right[n])]
+        if not frontier:
+            return depth
+        depth += 1
+
+
+def compile_boosters(boosters, feature_names, source_fingerprints=None):
+    """
+    Pack {task name: booster} into the flat arrays saved by export_models.py.
+    Every tree is padded to the same node count; leaves point at themselves so
+    a fixed number of steps walks any row to its leaf.
+    """
+    names, tree_offsets, base_scores = [], [0], []
+    all_trees = []
+    for name, booster in boosters.items():
+        trees, base_score = flatten_booster(booster)
+        names.append(name)
+        all_trees.extend(trees)
+        tree_offsets.append(len(all_trees))
+        base_scores.append(base_score)
+
+    num_trees = len(all_trees)
+    width = max(len(t['left']) for t in all_trees)
+    feature = np.zeros((num_trees, width), dtype=np.int32)
+    threshold = np.zeros((num_trees, width), dtype=np.float32)
+    left = np.tile(np.arange(width, dtype=np.int32), (num_trees, 1))
+    right = left.copy()
+    missing = left.copy()
+    value = np.zeros((num_trees, width), dtype=np.float32)
+    max_depth = 0
+
+    for t, tree in enumerate(all_trees):
+        max_depth = max(max_depth, _tree_depth(tree['left'], tree['right']))
+        for n, (lc, rc) in enumerate(zip(tree['left'], tree['right'])):
+            if lc == -1:
+                value[t, n] = tree['value'][n]
+                continue
+            feature[t, n] = tree['feature'][n]
+            threshold[t, n] = tree['threshold'][n]
+            left[t, n], right[t, n] = lc, rc
+            missing[t, n] = lc if tree['default_left'][n] else rc
+
+    fingerprints = source_fingerprints or {}
+    return {
+        'format_version': np.array(COMPILED_FORMAT_VERSION),
+        'task_names': np.array(names),
+        'feature_names': np.array(feature_names),
+        'source_fingerprints': np.array([fingerprints.get(name, '') for name in names]),
+        'tree_offsets': np.array(tree_offsets, dtype=np.int64),
+        'base_scores': np.array(base_scores, dtype=np.float32),
+        'max_depth': np.array(max_depth),
+        'feature': feature,
+        'threshold': threshold,
+        'left': left,
+        'right': right,
+        'missing': missing,
+        'value': value,
+    }
+
+
+def save_compiled(path, arrays):
+    np.savez_compressed(path, **arrays)
+
+
+class CompiledModels:
+    """
+    All compiled ensembles, evaluated together.
+    predict(X) walks every tree of every model one level per step over the
+    float32 feature matrix X, then sums each model's leaves in tree order
+    (in float32, starting from base_score) the way XGBoost does.
+    """
+
+    def __init__(self, arrays):
+        version = int(arrays['format_version'])
+        if version != COMPILED_FORMAT_VERSION:
+            raise ValueError(f"Compiled models format {version} is not supported (expected {COMPILED_FORMAT_VERSION})")
+        self.task_names = [str(n) for n in arrays['task_names']]
+        self.feature_names = [str(n) for n in arrays['feature_names']]
+        self.source_fingerprints = dict(zip(self.task_names, (str(f) for f in arrays['source_fingerprints'])))
+        self.tree_offsets = arrays['tree_offsets']
+        self.base_scores = arrays['base_scores']
+        self.max_depth = int(arrays['max_depth'])
+
+        num_trees, width = arrays['feature'].shape
+        self.num_trees = num_trees
+        # Node arrays are indexed by (tree * width + node)
+        base = (np.arange(num_trees, dtype=np.int32) * width)[:, None]
+        self.roots = base[:, 0].copy()
+        self.feature = arrays['feature'].ravel()
+        self.threshold = arrays['threshold'].ravel()
+        self.left = (arrays['left'] + base).ravel()
+        self.right = (arrays['right'] + base).ravel()
+        self.missing = (arrays['missing'] + base).ravel()
+        self.value = arrays['value'].ravel()
+        self.slices = {
+            name: (int(self.tree_offsets[i]), int(self.tree_offsets[i + 1]), self.base_scores[i])
+            for i, name in enumerate(self.task_names)
+        }
+
+    @classmethod
+    def load(cls, path):
+        """Load a file written by export_models.py (never unpickles anything)"""
+        start = time.perf_counter()
+        with np.load(path, allow_pickle=False) as data:
+            compiled = cls({key: data[key] for key in data.files})
+        print(f"[models] loaded compiled ensembles from {path} in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return compiled
+
+    def _leaf_values(self, X, first, last):
+        """(rows x trees) leaf value reached by every row in trees first..last-1"""
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots[first:last], (len(X), last - first))
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[node]]
+            step = np.where(x < self.threshold[node], self.left[node], self.right[node])
+            node = np.where(np.isnan(x), self.missing[node], step)
+        return self.value[node]
+
+    def predict(self, X, task_names=None):
+        """Run the given models (all by default) over X; returns {task name: float32 array}"""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.shape[1] != len(self.feature_names):
+            raise ValueError(f"Compiled models expect {len(self.feature_names)} features, got {X.shape[1]}")
+        task_names = list(task_names) if task_names is not None else self.task_names
+        outputs = {name: np.empty(len(X), dtype=np.float32) for name in task_names}
+        # Only walk the trees of the requested models
+        span_first = min(self.slices[name][0] for name in task_names)
+        span_last = max(self.slices[name][1] for name in task_names)
+        for start in range(0, len(X), ROW_CHUNK):
+            leaves = self._leaf_values(X[start:start + ROW_CHUNK], span_first, span_last)
+            for name in task_names:
+                first, last, base_score = self.slices[name]
+                block = np.empty((len(leaves), last - first + 1), dtype=np.float32)
+                block[:, 0] = base_score
+                block[:, 1:] = leaves[:, first - span_first:last - span_first]
+                # cumsum adds strictly left to right, matching XGBoost's float32 accumulation
+                outputs[name][start:start + len(leaves)] = np.cumsum(block, axis=1, dtype=np.float32)[:, -1]
+        return outputs
+
+    def predict_task(self, name, X):
+        return self.predict(X, [name])[name]
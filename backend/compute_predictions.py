@@ -1,96 +1,467 @@
 """
 Script to pre-compute predictions for all players and store in database.
-Run this once to populate the predictions table.
+Run this once to populate the predictions table. With --recompute stale it
+only recomputes rows whose player inputs or models changed since they were
+written (e.g. after a data refresh or retraining one model); --recompute
+(all) replaces every row.
+
+Each run writes a new prediction version (see prediction_versions.py): a
+copy of the active predictions, or an empty table with --recompute all. The
+API keeps reading the active version until the run finishes and the new one
+is switched in; --rollback switches back to the previous version.
+
+The player id space is split into contiguous shards that run on a pool of
+worker processes; each worker loads the models once and writes its own
+batches. After every committed batch the shard's position is saved to a
+checkpoint file, so an interrupted run picks up where it stopped when it is
+started again with the same options.
+
+Usage: python compute_predictions.py [batch size] [--workers N] [--recompute [all|stale]] [--fresh]
+       python compute_predictions.py --rollback | --versions
 """
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import shutil
 from sqlmodel import Session, select
+from sqlalchemy import func, insert, delete
 from database import engine, create_db_and_tables
-from models import Player, PlayerPrediction
-from predictor import predictNineYears
-from model_utils import player_to_features
+from models import Player
+import prediction_versions
+from predictor import (predictNineYears, predictNineYearsBatch, bundleFingerprint, inputFingerprints,
+                       configureInference, warmUpModels, setStageTimer)
+from stage_timer import StageTimer, summarize_batches
+from model_utils import rows_to_features, SIMULATION_COLUMNS
+from config import settings
 from datetime import datetime
 import time
 
-def compute_all_predictions():
-    """Compute predictions for all players and store in database"""
-    
+# Shards per worker: more, smaller shards keep every worker busy until the end
+SHARDS_PER_WORKER = 4
+# None: only players without a prediction; 'stale': also rows whose feature hash
+# or model fingerprint no longer match; 'all': every player
+RECOMPUTE_MODES = (None, 'stale', 'all')
+
+def pending_players_query(table, after_id, upto_id, recompute=None):
+    """
+    Rows of (id, SIMULATION_COLUMNS..., stored feature_hash, stored model_fingerprint)
+    for players in the id range (after_id, upto_id], in id order. Plain column
+    tuples, not Player objects, so a batch costs only the columns it needs.
+    Unless looking for stale rows, only players without a row in the prediction
+    table (one anti-join instead of a lookup per player).
+    """
+    query = (
+        select(Player.id, *[getattr(Player, column) for column in SIMULATION_COLUMNS],
+               table.c.feature_hash, table.c.model_fingerprint)
+        .outerjoin(table, table.c.player_id == Player.id)
+        .where(Player.id > after_id, Player.id <= upto_id)
+    )
+    if recompute != 'stale':
+        query = query.where(table.c.id.is_(None))
+    return query.order_by(Player.id)
+
+def prediction_row(player, stats_library, computed_at, feature_hash=None, model_fingerprint=None):
+    """Column values of one PlayerPrediction row (player: anything with an id)"""
+    return {
+        'player_id': player.id,
+        'stats_library': stats_library,
+        'year1_overall': int(stats_library[0].get('predictOverall', 0)),
+        'year1_value': int(stats_library[0].get('predictValue', 0)),
+        'year1_goals': float(stats_library[0].get('predictedGoals', 0)),
+        'year1_assists': float(stats_library[0].get('predictedAssists', 0)),
+        'computed_at': computed_at,
+        'feature_hash': feature_hash,
+        'model_fingerprint': model_fingerprint,
+    }
+
+def predict_chunk(players, features):
+    """statsLibrary per player (None where it failed), batched with a per-player fallback"""
+    try:
+        # Run the whole chunk through the batched simulation
+        return predictNineYearsBatch(features, players)
+    except Exception as e:
+        print(f"Batch failed ({e}), falling back to per-player predictions")
+
+    libraries = []
+    for i, player in enumerate(players):
+        try:
+            libraries.append(predictNineYears(features.iloc[[i]].reset_index(drop=True), player))
+        except Exception as e:
+            print(f"ERROR: player {player.id} - {str(e)}")
+            libraries.append(None)
+    return libraries
+
+def _insert_rows(session, table, rows, replace):
+    if replace:
+        session.execute(delete(table).where(table.c.player_id.in_([row['player_id'] for row in rows])))
+    session.execute(insert(table), rows)
+    session.commit()
+
+def write_rows(session, table, rows, replace=False):
+    """
+    Insert a batch of prediction rows in one multi-row INSERT and one commit.
+    With replace, the players' existing rows are deleted in the same transaction.
+    If the batch fails, retry row by row so one bad row doesn't sink the rest.
+    Returns the number of rows written.
+    """
+    if not rows:
+        return 0
+    try:
+        _insert_rows(session, table, rows, replace)
+        return len(rows)
+    except Exception as e:
+        session.rollback()
+        print(f"Bulk insert failed ({e}), retrying row by row")
+
+    written = 0
+    for row in rows:
+        try:
+            _insert_rows(session, table, [row], replace)
+            written += 1
+        except Exception as e:
+            session.rollback()
+            print(f"ERROR: player {row['player_id']} - {str(e)}")
+    return written
+
+# CHECKPOINTS
+# One directory per run: run.json holds the run's options, shard bounds and
+# staging version, shard-NNN.json the last player id each shard committed. Each file is only
+# written by one process, and always through a rename so it is never half written.
+
+def _write_json(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _shard_path(checkpoint_dir, index):
+    return os.path.join(checkpoint_dir, f"shard-{index:03d}.json")
+
+def plan_shards(min_id, max_id, count):
+    """Split the ids min_id..max_id into `count` contiguous (after_id, upto_id] ranges"""
+    span = max_id - min_id + 1
+    count = max(1, min(count, span))
+    bounds = [min_id - 1 + (span * i) // count for i in range(count + 1)]
+    return [[bounds[i], bounds[i + 1]] for i in range(count)]
+
+def load_checkpoint(checkpoint_dir, run):
+    """
+    Staging version and shard progress saved by an earlier run with the same
+    options and models: (version, {shard index: {'last_id', 'done', ...}}),
+    or None if there is nothing to resume.
+    """
+    saved = _read_json(os.path.join(checkpoint_dir, "run.json"))
+    if saved is None or saved['run'] != run or not prediction_versions.is_staging(saved['version']):
+        return None
+    progress = {
+        index: _read_json(_shard_path(checkpoint_dir, index)) or {'last_id': after_id, 'done': False}
+        for index, (after_id, _) in enumerate(run['shards'])
+    }
+    return saved['version'], progress
+
+def start_checkpoint(checkpoint_dir, run, version):
+    """Start a new checkpoint, discarding the staging version of an abandoned run"""
+    saved = _read_json(os.path.join(checkpoint_dir, "run.json"))
+    if saved is not None and saved['version'] != version and prediction_versions.is_staging(saved['version']):
+        prediction_versions.discard_version(saved['version'])
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    os.makedirs(checkpoint_dir)
+    _write_json(os.path.join(checkpoint_dir, "run.json"), {'run': run, 'version': version})
+
+# WORKERS
+
+def init_worker():
+    """Worker process setup: one core per worker, models loaded once up front"""
+    configureInference('sequential', threads=1)
+    warmUpModels()
+
+def compute_shard(index, after_id, upto_id, batch_size, recompute, version, checkpoint_dir, on_batch=None):
+    """
+    Predict and store every pending player of one shard into the prediction
+    table of `version`, batch by batch.
+    Each batch is a fresh keyset query (id > last committed id), so the shard can
+    stop at any point and resume from its checkpoint. Every batch's stage timings
+    are saved with the checkpoint. Returns the shard's counts and timings.
+    """
+    path = _shard_path(checkpoint_dir, index)
+    progress = _read_json(path) or {'last_id': after_id, 'done': False, 'players': 0, 'written': 0,
+                                    'errors': 0, 'unchanged': 0, 'batches': []}
+    if progress['done']:
+        return progress
+    model_fingerprint = bundleFingerprint()
+    table = prediction_versions.prediction_table(version)
+    timer = StageTimer()
+    # The predictor adds its inference, rules and serialize stages to the same timer
+    setStageTimer(timer)
+
+    try:
+        with Session(engine) as session:
+            while True:
+                with timer.stage('fetch'):
+                    query = pending_players_query(table, progress['last_id'], upto_id, recompute).limit(batch_size)
+                    chunk = session.exec(query).all()
+                if not chunk:
+                    break
+                last_id = chunk[-1].id
+                with timer.stage('features'):
+                    # The rows stand in for Player objects (value_eur, player_positions)
+                    players = chunk
+                    features = rows_to_features(players)
+                    feature_hashes = inputFingerprints(features, players)
+
+                if recompute == 'stale':
+                    # Only rows written from other inputs or other models
+                    stale = [i for i, row in enumerate(chunk)
+                             if row.feature_hash != feature_hashes[i] or row.model_fingerprint != model_fingerprint]
+                    progress['unchanged'] += len(chunk) - len(stale)
+                    players = [players[i] for i in stale]
+                    feature_hashes = [feature_hashes[i] for i in stale]
+                    features = features.iloc[stale].reset_index(drop=True)
+
+                written = 0
+                if players:
+                    with timer.stage('simulate'):
+                        libraries = predict_chunk(players, features)
+                    with timer.stage('serialize'):
+                        computed_at = datetime.utcnow().isoformat()
+                        rows = [prediction_row(player, stats_library, computed_at, feature_hash, model_fingerprint)
+                                for player, stats_library, feature_hash in zip(players, libraries, feature_hashes)
+                                if stats_library is not None]
+                    with timer.stage('write'):
+                        written = write_rows(session, table, rows, replace=recompute == 'stale')
+                progress['players'] += len(chunk)
+                progress['written'] += written
+                progress['errors'] += len(players) - written
+                progress['last_id'] = last_id
+                progress['batches'].append({
+                    'players': len(chunk),
+                    'stages': {name: round(ms, 3) for name, ms in timer.take().items()},
+                })
+                _write_json(path, progress)
+                batch_ms = sum(progress['batches'][-1]['stages'].values())
+                print(f"[shard {index}] up to player {progress['last_id']}/{upto_id}: {written} written in {batch_ms:.0f} ms")
+                if on_batch is not None:
+                    on_batch()
+    finally:
+        setStageTimer(None)
+
+    progress['done'] = True
+    _write_json(path, progress)
+    return progress
+
+class ProgressReporter:
+    """
+    Periodic progress line for a run, built from the shard checkpoint files
+    (so it covers worker processes too): players done, players/sec, ETA and
+    per-batch timings by stage.
+    """
+
+    def __init__(self, checkpoint_dir, shard_count, target, interval):
+        self.checkpoint_dir = checkpoint_dir
+        self.shard_count = shard_count
+        self.target = target
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.reported = self.started
+        # Players finished by an earlier, interrupted run don't count towards this run's rate
+        self.baseline = sum(p.get('players', 0) for p in self.progress())
+
+    def progress(self):
+        shards = (_read_json(_shard_path(self.checkpoint_dir, index)) for index in range(self.shard_count))
+        return [p for p in shards if p is not None]
+
+    def players_per_sec(self, players):
+        elapsed = time.perf_counter() - self.started
+        return (players - self.baseline) / elapsed if elapsed > 0 else 0.0
+
+    def maybe_report(self, force=False):
+        now = time.perf_counter()
+        if not force and now - self.reported < self.interval:
+            return
+        self.reported = now
+        progress = self.progress()
+        players = sum(p.get('players', 0) for p in progress)
+        rate = self.players_per_sec(players)
+        eta = f"{max(self.target - players, 0) / rate:.0f}s" if rate > 0 else "?"
+        summary = summarize_batches([batch for p in progress for batch in p.get('batches', [])])
+        shares = " ".join(f"{name} {stage['share']:.0%}" for name, stage in summary['stages'].items() if stage['share'] is not None)
+        batch_ms = summary['batch_ms']
+        timings = f" | batch p50 {batch_ms['p50']:.0f} ms p95 {batch_ms['p95']:.0f} ms | {shares}" if batch_ms else ""
+        print(f"[progress] {players}/{self.target} players | {rate:.1f} players/s | ETA {eta}{timings}")
+
+def compute_all_predictions(batch_size=None, workers=None, recompute=None, fresh=False):
+    """
+    Compute predictions for all players and store in database.
+    - batch_size: players per simulation batch, INSERT and commit
+    - workers: worker processes (1 runs every shard in this process)
+    - recompute: None fills in missing predictions, 'stale' also replaces rows
+      whose inputs or models changed, 'all' replaces every row
+    - fresh: ignore the checkpoint of an earlier, interrupted run
+    """
+    if recompute not in RECOMPUTE_MODES:
+        raise ValueError(f"Unknown recompute mode '{recompute}', expected one of {RECOMPUTE_MODES}")
+    batch_size = batch_size or settings.PRECOMPUTE_BATCH_SIZE
+    workers = workers or settings.PRECOMPUTE_WORKERS
+    checkpoint_dir = settings.PRECOMPUTE_CHECKPOINT_DIR
+    summary_file = settings.PRECOMPUTE_SUMMARY_FILE
+    start = time.perf_counter()
+    started_at = datetime.utcnow().isoformat()
+
     print("="*60)
     print("STARTING PREDICTION COMPUTATION")
     print("="*60)
-    
+
     # Ensure tables exist
     print("\n[1/5] Creating database tables...")
     create_db_and_tables()
     print("✓ Tables created/verified")
-    
+
     with Session(engine) as session:
-        # Get all players
-        print("\n[2/5] Fetching all players from database...")
-        players = session.exec(select(Player)).all()
-        total = len(players)
-        print(f"✓ Found {total} players to process")
-        
+        print("\n[2/5] Counting players...")
+        total, min_id, max_id = session.exec(select(func.count(), func.min(Player.id), func.max(Player.id))).one()
+        print(f"✓ Found {total} players")
+
         print("\n[3/5] Checking for existing predictions...")
-        existing_count = session.exec(select(PlayerPrediction)).all()
-        print(f"✓ {len(existing_count)} predictions already computed")
-        
-        print("\n[4/5] Computing predictions...")
-        print("-"*60)
-        
-        success_count = 0
-        error_count = 0
-        skipped_count = 0
-        
-        for idx, player in enumerate(players, 1):
-            try:
-                # Check if prediction already exists
-                existing = session.exec(
-                    select(PlayerPrediction).where(PlayerPrediction.player_id == player.id)
-                ).first()
-                
-                if existing:
-                    skipped_count += 1
-                    print(f"[{idx}/{total}] SKIP: {player.short_name}")
-                    continue
-                
-                # Convert player to features and run predictions
-                features = player_to_features(player)
-                stats_library = predictNineYears(features, player)
-                
-                # Create prediction record
-                prediction = PlayerPrediction(
-                    player_id=player.id,
-                    stats_library=stats_library,
-                    year1_overall=int(stats_library[0].get('predictOverall', 0)),
-                    year1_value=int(stats_library[0].get('predictValue', 0)),
-                    year1_goals=float(stats_library[0].get('predictedGoals', 0)),
-                    year1_assists=float(stats_library[0].get('predictedAssists', 0)),
-                    computed_at=datetime.utcnow().isoformat()
+        active = prediction_versions.active_version(session)
+        existing_count = session.exec(select(func.count()).select_from(prediction_versions.prediction_table(active))).one()
+        print(f"✓ {existing_count} predictions already computed (version {active})")
+
+    if not total:
+        print("No players to predict")
+        return
+
+    # A checkpoint is only resumed by a run with the same options, over the same
+    # ids, with the same models; anything else starts over
+    run = {
+        'recompute': recompute,
+        'models': bundleFingerprint(),
+        'shards': plan_shards(min_id, max_id, workers * SHARDS_PER_WORKER if workers > 1 else 1),
+    }
+    checkpoint = None if fresh else load_checkpoint(checkpoint_dir, run)
+    if checkpoint is None:
+        # Readers stay on the active version while the new one is written
+        version = prediction_versions.create_version(
+            copy_from=None if recompute == 'all' else active,
+            model_fingerprint=run['models'],
+        )
+        start_checkpoint(checkpoint_dir, run, version)
+        progress = {}
+    else:
+        version, progress = checkpoint
+        finished = sum(1 for p in progress.values() if p['done'])
+        print(f"\nResuming from checkpoint: {finished}/{len(run['shards'])} shards already done")
+
+    print(f"\n[4/5] Computing predictions into version {version} ({len(run['shards'])} shards, {workers} workers, batches of {batch_size})...")
+    print("-"*60)
+
+    shards = [(index, after_id, upto_id, batch_size, recompute, version, checkpoint_dir)
+              for index, (after_id, upto_id) in enumerate(run['shards'])
+              if not progress.get(index, {}).get('done')]
+    results = [p for p in progress.values() if p['done']]
+    # Fills only visit players without a prediction; recomputes visit everyone
+    target = total if recompute else max(total - existing_count, 0)
+    reporter = ProgressReporter(checkpoint_dir, len(run['shards']), target, settings.PRECOMPUTE_REPORT_SECONDS)
+    if workers > 1:
+        # Spawn so workers don't inherit the parent's connections or XGBoost/OpenMP thread state
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+        ) as pool:
+            pending = {pool.submit(compute_shard, *shard) for shard in shards}
+            while pending:
+                finished, pending = concurrent.futures.wait(
+                    pending, timeout=settings.PRECOMPUTE_REPORT_SECONDS,
+                    return_when=concurrent.futures.FIRST_COMPLETED,
                 )
-                
-                session.add(prediction)
-                session.commit()
-                
-                success_count += 1
-                print(f"[{idx}/{total}] DONE: {player.short_name}")
-                
-            except Exception as e:
-                error_count += 1
-                print(f"[{idx}/{total}] ERROR: {player.short_name} - {str(e)}")
-                session.rollback()
-                continue
-        
-        print(f"\n[5/5] Finalizing...")
-        print("="*60)
-        print("COMPUTATION COMPLETE!")
-        print("="*60)
-        print(f"Total Players: {total}")
-        print(f"✓ Success: {success_count}")
-        print(f"⊘ Skipped: {skipped_count}")
-        print(f"✗ Errors: {error_count}")
-        print("="*60)
+                for future in finished:
+                    results.append(future.result())
+                    print(f"[{len(shards) - len(pending)}/{len(shards)}] shards finished")
+                reporter.maybe_report()
+    else:
+        for shard in shards:
+            results.append(compute_shard(*shard, on_batch=reporter.maybe_report))
+    reporter.maybe_report(force=True)
+
+    success_count = sum(r['written'] for r in results)
+    error_count = sum(r['errors'] for r in results)
+    unchanged_count = sum(r.get('unchanged', 0) for r in results)
+    players = sum(r.get('players', 0) for r in results)
+    summary = {
+        'started_at': started_at,
+        'finished_at': datetime.utcnow().isoformat(),
+        'elapsed_s': round(time.perf_counter() - start, 3),
+        'recompute': recompute,
+        'workers': workers,
+        'batch_size': batch_size,
+        'version': version,
+        'models': run['models'],
+        'players_total': total,
+        'players_visited': players,
+        'written': success_count,
+        'unchanged': unchanged_count,
+        'errors': error_count,
+        'players_per_sec': round(reporter.players_per_sec(players), 2),
+        **summarize_batches([batch for r in results for batch in r.get('batches', [])]),
+    }
+
+    print(f"\n[5/5] Finalizing...")
+    if success_count:
+        prediction_versions.activate_version(version)
+    else:
+        # Nothing new: keep the active version (and the rollback targets behind it)
+        prediction_versions.discard_version(version)
+        print(f"No predictions written, version {active} stays active")
+    summary['activated'] = bool(success_count)
+    # Everything is stored; the next run starts from scratch
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    print("="*60)
+    print("COMPUTATION COMPLETE!")
+    print("="*60)
+    print(f"Total Players: {total}")
+    print(f"✓ Success: {success_count}")
+    if recompute is None:
+        print(f"⊘ Skipped (copied from version {active}): {existing_count}")
+    elif recompute == 'stale':
+        print(f"⊘ Up to date: {unchanged_count}")
+    print(f"✗ Errors: {error_count}")
+    print(f"Throughput: {summary['players_per_sec']} players/s")
+    for name, stage in summary['stages'].items():
+        print(f"  {name:<10} {stage['total_s']:>9.1f} s  {stage['share']:>6.1%}  p50 {stage['batch_ms'].get('p50', 0):.1f} ms/batch")
+    print("="*60)
+
+    _write_json(summary_file, summary)
+    print(f"Summary written to {summary_file}")
+    return summary
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-compute player predictions")
+    parser.add_argument("batch_size", nargs="?", type=int, help="players per batch (default PRECOMPUTE_BATCH_SIZE)")
+    parser.add_argument("--workers", type=int, help="worker processes (default PRECOMPUTE_WORKERS)")
+    parser.add_argument("--recompute", nargs="?", const="all", choices=["all", "stale"],
+                        help="replace every stored prediction, or only stale ones")
+    parser.add_argument("--fresh", action="store_true", help="ignore the checkpoint of an interrupted run")
+    parser.add_argument("--rollback", action="store_true", help="switch back to the previous prediction version")
+    parser.add_argument("--versions", action="store_true", help="list prediction versions")
+    args = parser.parse_args()
+    if args.rollback:
+        prediction_versions.rollback()
+        raise SystemExit
+    if args.versions:
+        for record in prediction_versions.list_versions():
+            print(f"v{record.id}: {record.status}, {record.row_count} rows, models {record.model_fingerprint}, "
+                  f"created {record.created_at}, activated {record.activated_at}")
+        raise SystemExit
     start_time = time.time()
-    compute_all_predictions()
+    compute_all_predictions(args.batch_size, args.workers, args.recompute, args.fresh)
     elapsed = time.time() - start_time
     print(f"\nTotal time: {elapsed:.1f} seconds ({elapsed/60:.1f} minutes)")
@@ -10,6 +10,81 @@ class Settings(BaseSettings):
     AWS_ACCESS_KEY_ID: str = "Update"
     AWS_SECRET_ACCESS_KEY: str = "Update"
 
+    # Model inference: "sequential", "thread" (shared thread pool) or "process" (process pool)
+    INFERENCE_MODE: str = "thread"
+    INFERENCE_WORKERS: int = 4
+    # Threads each XGBoost model may use per predict (0 = XGBoost default, all cores)
+    MODEL_THREADS: int = 1
+    # Where the pickled models live, and whether to load them all at startup
+    # instead of on first use
+    MODELS_DIR: str = os.path.join(os.path.dirname(BASE_DIR), "models")
+    PRELOAD_MODELS: bool = False
+    # Model backend: "xgboost" (pickled models), "compiled" (array-encoded copies
+    # written by export_models.py, no pickles loaded) or "auto" (compiled for
+    # batches of up to COMPILED_MAX_ROWS rows, XGBoost above that)
+    MODEL_BACKEND: str = "auto"
+    COMPILED_MODELS_FILE: str = "compiledModels.npz"
+    COMPILED_MAX_ROWS: int = 8
+    # Live what-if simulations (POST /simulatePlayer): worker threads and the
+    # p95 latency the endpoint is expected to stay under
+    SIMULATION_WORKERS: int = 2
+    SIMULATION_P95_TARGET_MS: float = 50.0
+    # Cache of predictStats / predictNineYears results (0 entries disables it,
+    # 0 seconds never expires) and how often to look for changed model files
+    PREDICTION_CACHE_SIZE: int = 4096
+    PREDICTION_CACHE_TTL_SECONDS: float = 3600.0
+    MODEL_CHECK_SECONDS: float = 30.0
+    # Monte Carlo bands: noise added to the rule-adjusted results of each rollout
+    # (ratings in rating points, value and minutes/season totals on the log scale)
+    # and the most rollouts a request may ask for
+    MONTE_CARLO_RATING_SD: float = 1.0
+    MONTE_CARLO_VALUE_SD: float = 0.15
+    MONTE_CARLO_STATS_SD: float = 0.15
+    MONTE_CARLO_MAX_SAMPLES: int = 500
+    # Players per batch in compute_predictions.py (one simulation, one INSERT, one commit)
+    PRECOMPUTE_BATCH_SIZE: int = 512
+    # Worker processes for compute_predictions.py (1 = run in-process) and where
+    # an interrupted run keeps its per-shard checkpoints
+    PRECOMPUTE_WORKERS: int = 1
+    PRECOMPUTE_CHECKPOINT_DIR: str = os.path.join(BASE_DIR, ".precompute_checkpoint")
+    # How often a run prints its progress line, and where the final timing summary goes
+    PRECOMPUTE_REPORT_SECONDS: float = 10.0
+    PRECOMPUTE_SUMMARY_FILE: str = os.path.join(BASE_DIR, "precompute_summary.json")
+    # Blue/green prediction tables: earlier versions kept for rollback, and how
+    # often the API re-reads which version is active
+    PREDICTION_VERSIONS_KEPT: int = 2
+    PREDICTION_VERSION_CHECK_SECONDS: float = 5.0
+    # Encoded /predictPlayer responses kept in memory per (player, prediction
+    # version); the TTL bounds how long an edited player row can be served stale
+    RESPONSE_CACHE_SIZE: int = 2048
+    RESPONSE_CACHE_TTL_SECONDS: float = 300.0
+    # Most player IDs one POST /predictPlayers request may ask for
+    BULK_PREDICTION_MAX_IDS: int = 100
+    # How long clients may reuse a prediction response before revalidating it
+    # with its ETag, and the smallest response body worth gzipping (bytes)
+    HTTP_CACHE_MAX_AGE_SECONDS: int = 300
+    GZIP_MINIMUM_SIZE: int = 1000
+    # Player search: results per query, how often to look for a changed players
+    # table (and rebuild the index), and the share of a query's trigrams a name
+    # must contain to count as a fuzzy match
+    SEARCH_RESULTS_LIMIT: int = 10
+    SEARCH_INDEX_CHECK_SECONDS: float = 60.0
+    SEARCH_FUZZY_THRESHOLD: float = 0.4
+    # Database connection pool (per process, for the sync and the async engine).
+    # DB_POOL_MODE: "queue" (long-running servers), "lambda" (one connection
+    # kept per container), "null" (connect per request, behind an external
+    # pooler) or "auto" (lambda inside AWS Lambda, queue elsewhere).
+    # DB_STATEMENT_TIMEOUT_MS (0 = none) is set on Postgres connections.
+    DB_POOL_MODE: str = "auto"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 0
+    # Log SQL statements that take at least this many ms (0 = off)
+    DB_SLOW_QUERY_MS: float = 0.0
+
     class Config:
         # CRITICAL FIX: We join the BASE_DIR path with the filename '.env' 
         # to ensure the path correctly resolves to C:\projects\fut\backend\.env
@@ -17,4 +92,3 @@ class Settings(BaseSettings):
         env_file_encoding = "utf-8"
 
 settings = Settings()
-print(f"[config] DATABASE_URL={settings.DATABASE_URL}")  # temporary: verify user/db
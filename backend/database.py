@@ -1,9 +1,79 @@
-from typing import Generator
+import os
+from typing import AsyncGenerator, Generator
 from sqlmodel import create_engine, Session, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 from config import settings
+import metrics
 
-engine = create_engine(settings.DATABASE_URL, echo=True)
+# Drivers the async engine uses in place of the sync ones
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def pool_mode() -> str:
+    """DB_POOL_MODE, with "auto" resolved to "lambda" inside AWS Lambda and "queue" elsewhere"""
+    if settings.DB_POOL_MODE not in ("auto", "queue", "lambda", "null"):
+        raise ValueError(f"Unknown DB_POOL_MODE {settings.DB_POOL_MODE!r}")
+    if settings.DB_POOL_MODE != "auto":
+        return settings.DB_POOL_MODE
+    return "lambda" if os.environ.get("AWS_LAMBDA_FUNCTION_NAME") else "queue"
+
+def engine_options(url, driver: str) -> dict:
+    """
+    create_engine / create_async_engine arguments for the configured pool mode:
+    "queue" keeps DB_POOL_SIZE connections (plus DB_MAX_OVERFLOW) open between
+    requests, "lambda" keeps a single one per container (a Lambda container
+    serves one request at a time, and reusing its connection across warm
+    invocations saves the connection setup), "null" connects per checkout
+    (behind an external pooler such as RDS Proxy or PgBouncer).
+    """
+    options = {}
+    mode = pool_mode()
+    if mode == "null":
+        options["poolclass"] = NullPool
+    elif url.get_backend_name() != "sqlite":
+        options.update(
+            pool_size=1 if mode == "lambda" else settings.DB_POOL_SIZE,
+            max_overflow=0 if mode == "lambda" else settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+            pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+    if settings.DB_STATEMENT_TIMEOUT_MS and url.get_backend_name() == "postgresql":
+        timeout = str(settings.DB_STATEMENT_TIMEOUT_MS)
+        if driver == "asyncpg":
+            options["connect_args"] = {"server_settings": {"statement_timeout": timeout}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+    return options
+
+def async_database_url():
+    """DATABASE_URL with the async driver of its database (asyncpg's ssl parameter in place of sslmode)"""
+    url = make_url(settings.DATABASE_URL)
+    url = url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+    if url.get_backend_name() == "postgresql" and "sslmode" in url.query:
+        url = url.update_query_dict({"ssl": url.query["sslmode"]}).difference_update_query(["sslmode"])
+    return url
+
+_url = make_url(settings.DATABASE_URL)
+engine = create_engine(_url, **engine_options(_url, _url.get_driver_name()))
+
+# Async engine for the API's read endpoints
+_async_url = async_database_url()
+async_engine = create_async_engine(_async_url, **engine_options(_async_url, _async_url.get_driver_name()))
+
+# Query counts and times per request, and slow-query logging (see metrics.py)
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine.sync_engine)
+
+# Columns added to existing tables after they were first created: (table, column, SQL type)
+ADDED_COLUMNS = [
+    ("player_predictions", "feature_hash", "VARCHAR"),
+    ("player_predictions", "model_fingerprint", "VARCHAR"),
+    ("prediction_versions", "deactivated_at", "VARCHAR"),
+]
 
 def create_db_and_tables():
     """
@@ -20,9 +90,23 @@ def create_db_and_tables():
     # Create tables within the 'fut' schema via search_path
     SQLModel.metadata.create_all(engine)
 
+    # create_all only creates missing tables; add columns introduced since
+    with engine.connect() as conn:
+        for table, column, column_type in ADDED_COLUMNS:
+            conn.execute(text(f"ALTER TABLE fut.{table} ADD COLUMN IF NOT EXISTS {column} {column_type}"))
+        conn.commit()
+
 def get_session() -> Generator[Session, None, None]:
     """
     A dependency function for FastAPI to manage database connections per request.
     """
     with Session(engine) as session:
-        yield session
\ No newline at end of file
+        yield session
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Async counterpart of get_session for the async endpoints. Code shared with
+    the sync scripts runs on it through `await session.run_sync(fn, ...)`.
+    """
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
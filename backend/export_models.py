@@ -0,0 +1,37 @@
+"""
+Script to export the pickled XGBoost models into the compiled, array-encoded
+format read by compiled_models.CompiledModels (used when MODEL_BACKEND is
+"compiled" or "auto"). Re-run it whenever a model in models/ is retrained.
+
+Usage: python export_models.py [output path]
+"""
+import os
+import sys
+import numpy as np
+from model_utils import MODEL_FEATURES
+from compiled_models import compile_boosters, save_compiled, CompiledModels
+from predictor import MODEL_REGISTRY, MODEL_TASKS, COMPILED_MODELS_PATH
+
+
+def export_models(path=COMPILED_MODELS_PATH):
+    boosters = {task_name: MODEL_REGISTRY.prepared(task_name)[0] for task_name in MODEL_TASKS}
+    fingerprints = {task_name: MODEL_REGISTRY.fingerprint(task_name) for task_name in MODEL_TASKS}
+    arrays = compile_boosters(boosters, MODEL_FEATURES, fingerprints)
+    save_compiled(path, arrays)
+
+    # Round trip: the saved file must reproduce the boosters on random rows
+    compiled = CompiledModels.load(path)
+    X = np.random.default_rng(0).uniform(0, 100, (256, len(MODEL_FEATURES))).astype(np.float32)
+    X[::5, ::7] = np.nan
+    predictions = compiled.predict(X)
+    for task_name, booster in boosters.items():
+        expected = booster.inplace_predict(X)
+        if not np.array_equal(predictions[task_name], expected):
+            raise ValueError(f"Compiled {task_name} does not match the pickled model")
+
+    print(f"Exported {len(boosters)} models ({compiled.num_trees} trees, depth {compiled.max_depth}) "
+          f"to {path} ({os.path.getsize(path) / 1e3:.0f} KB)")
+
+
+if __name__ == "__main__":
+    export_models(sys.argv[1] if len(sys.argv) > 1 else COMPILED_MODELS_PATH)
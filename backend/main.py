@@ -1,12 +1,22 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from contextlib import asynccontextmanager
-from sqlmodel import Session, select
-from typing import List
-from model_utils import get_players_by_name, get_player_by_id
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Optional
+from model_utils import get_player_fields_by_name, resolve_fields
+from player_search import refresh_search_index
 
-from database import create_db_and_tables, get_session
-from models import Player, PlayerRead, PlayerPrediction
+from database import create_db_and_tables, get_async_session, async_engine
+from models import Player, SimulationRequest, SimulationStreamRequest, BulkPredictionRequest
+from config import settings
+from predictor import warmUpModels, modelStats, PREDICTION_CACHE
+import simulation_service
+import prediction_service
+import metrics
+import time
 
 # Mangum for AWS Lambda
 from mangum import Mangum
@@ -18,6 +28,7 @@ async def lifespan(app: FastAPI):
     # create_db_and_tables()
     print("Database ready.")
     yield
+    await async_engine.dispose()
 
 app = FastAPI(
     title="FUT Prediction API",
@@ -33,44 +44,197 @@ app.add_middleware(
     allow_credentials=False,  # Must be False when allow_origins=["*"]
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let browsers read the caching and timing headers of cross-origin responses
+    expose_headers=["ETag", "Server-Timing"],
 )
 
+# Compress large responses; the NDJSON simulation stream is left alone so
+# each year is sent as soon as it is computed
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=settings.GZIP_MINIMUM_SIZE,
+    exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES + ("application/x-ndjson",),
+)
+
+# Per-request latency, DB and cache metrics, Server-Timing header (see metrics.py)
+app.middleware("http")(metrics.observe_request)
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the FUT Prediction API!"}
 
-@app.get("/searchPlayers", response_model=List[PlayerRead])
-def searchPlayers(name: str, session: Session = Depends(get_session)):
+@app.get("/searchPlayers")
+async def searchPlayers(name: str, fields: str = "summary", session: AsyncSession = Depends(get_async_session)):
     """
-    Search for players by name (partial match) and return a list of PlayerRead objects.
+    Search for players by name, best matches first. Only the requested columns
+    are loaded: fields="summary" (default, PlayerSummary), "full" (every
+    PlayerRead field) or a comma-separated list of PlayerRead fields.
     """
-    players = get_players_by_name(session, name)
-    return players
+    try:
+        columns = resolve_fields(fields)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    # Built off the event loop if needed, so the search below doesn't build it
+    index = await refresh_search_index(session)
+    return await session.run_sync(get_player_fields_by_name, name, columns, index)
 
 @app.get("/predictPlayer/{playerID}")
-def predictPlayer(playerID: int, session: Session = Depends(get_session)):
+async def predictPlayer(playerID: int, session: AsyncSession = Depends(get_async_session),
+                        if_none_match: Optional[str] = Header(None)):
     """
     Get pre-computed predictions for a player from database (instant).
+    Hot players are served from the cache of encoded responses; a matching
+    If-None-Match gets 304 Not Modified.
     """
     try:
-        # Get cached prediction
-        cached = session.exec(
-            select(PlayerPrediction).where(PlayerPrediction.player_id == playerID)
-        ).first()
-        
-        if not cached:
-            return {"error": f"Predictions not found for player ID {playerID}"}
-        
-        # Get player info
-        player = get_player_by_id(session, playerID)
-        
-        return {
-            "player": player,
-            "statsLibrary": cached.stats_library
-        }
+        body = await session.run_sync(prediction_service.prediction_response, playerID)
     except Exception as e:
         return {"error": f"Query failed: {str(e)}"}
-        return {"error": f"Prediction failed: {str(e)}"}
+    if body is None:
+        return prediction_service.not_found(playerID)
+    return prediction_service.conditional_response(body, if_none_match)
+
+@app.post("/predictPlayers")
+async def predictPlayers(request: BulkPredictionRequest, session: AsyncSession = Depends(get_async_session),
+                         if_none_match: Optional[str] = Header(None)):
+    """
+    Pre-computed predictions for several players in one request, keyed by
+    player ID; IDs without predictions get an error entry. A matching
+    If-None-Match gets 412 Precondition Failed (304 is only for GET).
+    """
+    if not request.player_ids:
+        return JSONResponse(status_code=400, content={"error": "player_ids must not be empty"})
+    if len(set(request.player_ids)) > settings.BULK_PREDICTION_MAX_IDS:
+        return JSONResponse(status_code=400, content={"error": f"At most {settings.BULK_PREDICTION_MAX_IDS} player IDs per request"})
+    try:
+        body = await session.run_sync(prediction_service.bulk_prediction_response, request.player_ids)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": f"Query failed: {str(e)}"})
+    return prediction_service.conditional_response(body, if_none_match, method="POST")
+
+@app.post("/simulatePlayer")
+async def simulatePlayer(request: SimulationRequest, session: AsyncSession = Depends(get_async_session)):
+    """
+    Run the nine-year simulation live for a stored player with overridden
+    feature values, or for a fully custom feature payload.
+    Returns the same statsLibrary shape as /predictPlayer, plus stage timings
+    and, when samples > 0, p10/p50/p90 bands per metric per year.
+    """
+    start = time.perf_counter()
+    if request.player_id is not None and request.features is not None:
+        return JSONResponse(status_code=400, content={"error": "Provide either player_id or features, not both"})
+
+    if not 0 <= request.samples <= settings.MONTE_CARLO_MAX_SAMPLES:
+        return JSONResponse(status_code=400, content={"error": f"samples must be between 0 and {settings.MONTE_CARLO_MAX_SAMPLES}"})
+
+    player = None
+    if request.player_id is not None:
+        player = await session.get(Player, request.player_id)
+        if player is None:
+            return JSONResponse(status_code=404, content={"error": f"Player ID {request.player_id} not found"})
+    loaded = time.perf_counter()
+
+    try:
+        dfStats = simulation_service.build_features(
+            player, request.features, request.overrides, request.pos, request.player_positions
+        )
+        yearOverrides = simulation_service.normalize_year_overrides(request.year_overrides)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    built = time.perf_counter()
+
+    try:
+        statsLibrary, bands, simulate_ms = await simulation_service.simulate(
+            dfStats, player, yearOverrides, request.samples, request.seed
+        )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": f"Simulation failed: {str(e)}"})
+
+    timings = {
+        'load': (loaded - start) * 1000,
+        'features': (built - loaded) * 1000,
+        'simulate': simulate_ms,
+        'total': (time.perf_counter() - start) * 1000,
+    }
+    if request.samples:
+        simulation_service.MONTE_CARLO_LATENCY.record(timings)
+    else:
+        simulation_service.LATENCY.record(timings)
+    response = {
+        "player": player,
+        "statsLibrary": statsLibrary,
+        "timing_ms": {stage: round(ms, 2) for stage, ms in timings.items()},
+    }
+    if bands is not None:
+        response["bands"] = bands
+    return response
+
+@app.post("/simulatePlayer/stream")
+async def simulatePlayerStream(request: SimulationStreamRequest, session: AsyncSession = Depends(get_async_session)):
+    """
+    Same inputs as /simulatePlayer (without Monte Carlo samples), streamed as
+    NDJSON: one line per simulated year, sent as soon as that season is
+    computed. Supports a shorter horizon and ending the career early
+    (retirement age / no predicted minutes).
+    """
+    if request.player_id is not None and request.features is not None:
+        return JSONResponse(status_code=400, content={"error": "Provide either player_id or features, not both"})
+    if not 1 <= request.horizon <= 9:
+        return JSONResponse(status_code=400, content={"error": "horizon must be between 1 and 9"})
+
+    player = None
+    if request.player_id is not None:
+        player = await session.get(Player, request.player_id)
+        if player is None:
+            return JSONResponse(status_code=404, content={"error": f"Player ID {request.player_id} not found"})
+
+    try:
+        dfStats = simulation_service.build_features(
+            player, request.features, request.overrides, request.pos, request.player_positions
+        )
+        yearOverrides = simulation_service.normalize_year_overrides(request.year_overrides)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    return StreamingResponse(
+        simulation_service.stream_simulation(
+            dfStats, player, request.horizon,
+            retirementAge=request.retirement_age,
+            stopAtZeroMinutes=request.stop_at_zero_minutes,
+            yearOverrides=yearOverrides,
+        ),
+        media_type="application/x-ndjson",
+    )
+
+@app.get("/simulatePlayer/latency")
+def simulation_latency():
+    """
+    Latency percentiles of recent /simulatePlayer requests per stage, against
+    the p95 target. Requests with Monte Carlo samples are reported separately
+    under monte_carlo and don't count against the target.
+    """
+    return {**simulation_service.LATENCY.summary(), 'monte_carlo': simulation_service.MONTE_CARLO_LATENCY.summary()}
+
+@app.get("/models")
+def model_status():
+    """
+    Report which prediction models are loaded, their load time, memory and fingerprints.
+    """
+    return modelStats()
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """
+    Request latency histograms, DB and cache counters per endpoint, in Prometheus text format.
+    """
+    caches = {"predictions": PREDICTION_CACHE, "responses": prediction_service.RESPONSE_CACHE}
+    return PlainTextResponse(metrics.REGISTRY.render(caches), media_type="text/plain; version=0.0.4")
+
+# Load models during cold start (module import) rather than on the first request
+if settings.PRELOAD_MODELS:
+    warmUpModels()
 
 # Lambda handler
 handler = Mangum(app, lifespan="off")
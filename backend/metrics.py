@@ -0,0 +1,175 @@
+"""
+Request metrics for the API.
+A middleware (observe_request) times every request and counts what it did
+while running: database queries and their time (from SQLAlchemy cursor
+events on every engine) and cache lookups (PredictionCache.get; lookups on
+the simulation worker threads only show in the per-cache totals). Each
+response carries a Server-Timing header with the breakdown, and the totals
+per endpoint are kept as Prometheus histograms and counters, rendered by
+/metrics. The numbers are per process (per container on Lambda).
+Queries slower than DB_SLOW_QUERY_MS are logged, whether or not they run
+inside a request.
+"""
+import contextvars
+import threading
+import time
+from sqlalchemy import event
+from config import settings
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestMetrics:
+    """What one request spent its time on"""
+    __slots__ = ('db_queries', 'db_ms', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def server_timing(self, total_ms):
+        """Server-Timing header value"""
+        return ", ".join([
+            f"total;dur={total_ms:.2f}",
+            f'db;dur={self.db_ms:.2f};desc="{self.db_queries} queries"',
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+        ])
+
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def record_cache_lookup(hit):
+    """Count a cache lookup against the current request (no-op outside requests)"""
+    current = _current.get()
+    if current is not None:
+        if hit:
+            current.cache_hits += 1
+        else:
+            current.cache_misses += 1
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    ms = (time.perf_counter() - conn.info['query_started'].pop()) * 1000
+    current = _current.get()
+    if current is not None:
+        current.db_queries += 1
+        current.db_ms += ms
+    if settings.DB_SLOW_QUERY_MS and ms >= settings.DB_SLOW_QUERY_MS:
+        print(f"[slow query] {ms:.1f} ms: {' '.join(statement.split())[:500]}")
+
+
+def instrument_engine(engine):
+    """Time every statement run on `engine` (for async engines, pass engine.sync_engine)"""
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._latency = {}  # (method, route, status) -> [count per bucket..., sum, count]
+        self._db = {}       # (method, route) -> [queries, seconds]
+        self._cache = {}    # (method, route) -> [hits, misses]
+
+    def observe(self, method, route, status, seconds, current):
+        with self._lock:
+            series = self._latency.setdefault((method, route, status), [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += seconds
+            series[-1] += 1
+            db = self._db.setdefault((method, route), [0, 0.0])
+            db[0] += current.db_queries
+            db[1] += current.db_ms / 1000
+            cache = self._cache.setdefault((method, route), [0, 0])
+            cache[0] += current.cache_hits
+            cache[1] += current.cache_misses
+
+    def render(self, caches=None):
+        """
+        Prometheus text exposition of the request metrics, plus the counters
+        of the given caches ({name: PredictionCache}).
+        """
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP http_request_duration_seconds Request latency by endpoint",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            for (method, route, status), series in sorted(self._latency.items()):
+                labels = dict(method=method, route=route, status=status)
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"http_request_duration_seconds_bucket{_labels(**labels, le=bound)} {count}")
+                lines.append(f"http_request_duration_seconds_bucket{_labels(**labels, le='+Inf')} {series[-1]}")
+                lines.append(f"http_request_duration_seconds_sum{_labels(**labels)} {series[-2]:.6f}")
+                lines.append(f"http_request_duration_seconds_count{_labels(**labels)} {series[-1]}")
+
+            lines += [
+                "# HELP http_request_db_queries_total Database queries run by requests, by endpoint",
+                "# TYPE http_request_db_queries_total counter",
+            ]
+            lines += [f"http_request_db_queries_total{_labels(method=m, route=r)} {db[0]}"
+                      for (m, r), db in sorted(self._db.items())]
+            lines += [
+                "# HELP http_request_db_seconds_total Time requests spent in database queries, by endpoint",
+                "# TYPE http_request_db_seconds_total counter",
+            ]
+            lines += [f"http_request_db_seconds_total{_labels(method=m, route=r)} {db[1]:.6f}"
+                      for (m, r), db in sorted(self._db.items())]
+            lines += [
+                "# HELP http_request_cache_lookups_total Cache lookups made by requests, by endpoint and result",
+                "# TYPE http_request_cache_lookups_total counter",
+            ]
+            for (m, r), cache in sorted(self._cache.items()):
+                lines.append(f"http_request_cache_lookups_total{_labels(method=m, route=r, result='hit')} {cache[0]}")
+                lines.append(f"http_request_cache_lookups_total{_labels(method=m, route=r, result='miss')} {cache[1]}")
+
+        if caches:
+            stats = {name: cache.stats() for name, cache in caches.items()}
+            for metric, key, kind, help_text in (
+                ("cache_hits_total", "hits", "counter", "Cache hits"),
+                ("cache_misses_total", "misses", "counter", "Cache misses"),
+                ("cache_evictions_total", "evictions", "counter", "Entries evicted to stay within the size limit"),
+                ("cache_entries", "entries", "gauge", "Entries currently cached"),
+            ):
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+                lines += [f"{metric}{_labels(cache=name)} {values[key]}" for name, values in stats.items()]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+async def observe_request(request, call_next):
+    """HTTP middleware: time the request, record it and add the Server-Timing header"""
+    current = RequestMetrics()
+    token = _current.set(current)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        _current.reset(token)
+        seconds = time.perf_counter() - start
+        # The route template, so /predictPlayer/1 and /predictPlayer/2 share one series
+        route = getattr(request.scope.get('route'), 'path', 'unmatched')
+        REGISTRY.observe(request.method, route, status, seconds, current)
+    response.headers['Server-Timing'] = current.server_timing(seconds * 1000)
+    return response
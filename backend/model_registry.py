@@ -0,0 +1,157 @@
+"""
+Lazy registry for the pickled prediction models.
+Models are unpickled on first use (or all at once with warmUp), and every
+load records how long it took, how much memory it added and a content
+fingerprint of the model file.
+"""
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+
+def _rss_bytes():
+    """Resident memory of this process in bytes (Linux), or None if unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def fingerprint_bytes(data):
+    """Short content hash used as a model version"""
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def file_signature(path):
+    """(mtime, size) of a file, or None if it doesn't exist; cheap change detection"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def combine_fingerprints(fingerprints):
+    """One fingerprint for a {name: fingerprint} set of models"""
+    return fingerprint_bytes("|".join(f"{name}={fingerprints[name]}" for name in sorted(fingerprints)).encode())
+
+
+class ModelRegistry:
+    """
+    Loads models from `models_dir` on demand.
+    - specs: {name: (filename, key)}, where key picks one model out of a pickled
+      dict bundle (None when the file holds a single model)
+    - on_load: optional callback(name, model) run once per model after it is
+      unpickled; its return value is kept and available through prepared(name)
+    """
+
+    def __init__(self, models_dir, specs, on_load=None):
+        self.models_dir = models_dir
+        self.specs = dict(specs)
+        self.on_load = on_load
+        self._files = {}     # filename -> {'data', 'fingerprint', 'load_ms', 'memory_bytes', 'size_bytes'}
+        self._models = {}    # name -> model
+        self._prepared = {}  # name -> on_load result
+        self._lock = threading.RLock()
+
+    def _path(self, filename):
+        return os.path.join(self.models_dir, filename)
+
+    def _load_file(self, filename):
+        """Unpickle one model file, recording time, memory growth and fingerprint"""
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        with open(self._path(filename), "rb") as f:
+            data = f.read()
+        loaded = pickle.loads(data)
+        load_ms = (time.perf_counter() - start) * 1000
+        rss_after = _rss_bytes()
+        info = {
+            'data': loaded,
+            'fingerprint': fingerprint_bytes(data),
+            'load_ms': load_ms,
+            'memory_bytes': rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+            'size_bytes': len(data),
+        }
+        self._files[filename] = info
+        memory = f", +{info['memory_bytes'] / 1e6:.1f} MB" if info['memory_bytes'] is not None else ""
+        print(f"[models] loaded {filename} in {load_ms:.1f} ms{memory}")
+        return info
+
+    def get(self, name):
+        """Return the model, loading its file on first use"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._lock:
+            if name not in self._models:
+                filename, key = self.specs[name]
+                info = self._files.get(filename) or self._load_file(filename)
+                model = info['data'][key] if key is not None else info['data']
+                self._prepared[name] = self.on_load(name, model) if self.on_load else model
+                self._models[name] = model
+            return self._models[name]
+
+    def prepared(self, name):
+        """The on_load result for a model (loads it if needed)"""
+        if name not in self._prepared:
+            self.get(name)
+        return self._prepared[name]
+
+    def loaded_names(self):
+        return [name for name in self.specs if name in self._models]
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def warm_up(self, names=None):
+        """Eagerly load the given models (all by default) and return their stats"""
+        start = time.perf_counter()
+        for name in names or self.specs:
+            self.get(name)
+        print(f"[models] warm-up finished in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return self.stats()
+
+    def fingerprint(self, name):
+        """Content fingerprint of a model's file (hashed from disk if not loaded yet)"""
+        filename, _ = self.specs[name]
+        info = self._files.get(filename)
+        if info is not None:
+            return info['fingerprint']
+        with open(self._path(filename), "rb") as f:
+            return fingerprint_bytes(f.read())
+
+    def file_signatures(self):
+        """{filename: (mtime, size)} of every model file, to notice when they change on disk"""
+        return {filename: file_signature(self._path(filename)) for filename, _ in self.specs.values()}
+
+    def reset(self):
+        """Forget every loaded model; they are reloaded from disk on next use"""
+        with self._lock:
+            self._files.clear()
+            self._models.clear()
+            self._prepared.clear()
+
+    def bundle_fingerprint(self):
+        """One fingerprint covering every model file, for cache keys and stored predictions"""
+        return combine_fingerprints({name: self.fingerprint(name) for name in self.specs})
+
+    def stats(self):
+        """Per-model load time, memory, size and fingerprint"""
+        rows = []
+        for name, (filename, key) in self.specs.items():
+            info = self._files.get(filename)
+            rows.append({
+                'model': name,
+                'file': filename,
+                'bundle_key': key,
+                'loaded': name in self._models,
+                'load_ms': round(info['load_ms'], 2) if info else None,
+                'memory_bytes': info['memory_bytes'] if info else None,
+                'size_bytes': info['size_bytes'] if info else None,
+                'fingerprint': info['fingerprint'] if info else None,
+            })
+        return rows
@@ -5,7 +5,8 @@ import pandas as pd
 import pickle
 from typing import List, Dict
 from sqlmodel import Session, select
-from models import Player
+from models import Player, PlayerRead, PlayerSummary
+from player_search import search_player_ids
 
 # Feature columns in the exact order expected by the trained models
 # This should match X_outfield.csv column order
@@ -105,17 +106,65 @@ def player_to_features(player: Player) -> pd.DataFrame:
     df_pos['pos'] = pos_val
     return df_pos
 
+# Player columns a simulation reads: the model features (value_eur included,
+# the value rules start from it) plus the position fields
+SIMULATION_COLUMNS = list(DB_TO_MODEL_MAPPING) + ['pos', 'player_positions']
+MODEL_TO_DB_MAPPING = {model_col: db_col for db_col, model_col in DB_TO_MODEL_MAPPING.items()}
+
+def rows_to_features(rows) -> pd.DataFrame:
+    """
+    Feature DataFrame for many players at once from plain result rows (anything
+    with the SIMULATION_COLUMNS as attributes, e.g. rows of a column select),
+    so batch jobs don't need Player objects. Row i holds the same values
+    player_to_features gives for player i; pass the rows as the predictor's
+    `players` for value_eur and player_positions.
+    """
+    db_columns = [MODEL_TO_DB_MAPPING[name] for name in MODEL_FEATURES]
+    values = [[value if value is not None else 0.0 for value in (getattr(row, column) for column in db_columns)]
+              for row in rows]
+    df = pd.DataFrame(values, columns=MODEL_FEATURES)
+    df['pos'] = [row.pos for row in rows]
+    return df
+
 def get_players_by_name(session: Session, name: str) -> List[Player]:
     """
-    Retrieve a LIST of players for the frontend dropdown.
+    Retrieve a LIST of players for the frontend dropdown, best matches first
+    (accent-insensitive, see player_search.py).
     """
-    statement = select(Player).where(
-        (Player.name.ilike(f"%{name}%")) | 
-        (Player.long_name.ilike(f"%{name}%"))
-    ).limit(10) # Don't overwhelm the frontend
-    
-    results = session.exec(statement).all() # Returns a list of Player objects
-    return results
+    ids = search_player_ids(session, name)
+    if not ids:
+        return []
+    players = {player.id: player for player in session.exec(select(Player).where(Player.id.in_(ids)))}
+    return [players[player_id] for player_id in ids if player_id in players]
+
+def resolve_fields(fields: str) -> List[str]:
+    """
+    Player columns for a fields= parameter: "summary" (PlayerSummary), "full"
+    (every PlayerRead field) or a comma-separated list of PlayerRead fields.
+    The id is always included.
+    """
+    if fields == "summary":
+        return list(PlayerSummary.model_fields)
+    if fields == "full":
+        return list(PlayerRead.model_fields)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in PlayerRead.model_fields]
+    if unknown:
+        raise ValueError(f"Unknown player fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(["id"] + names))
+
+def get_player_fields_by_name(session: Session, name: str, fields: List[str], index=None) -> List[Dict]:
+    """
+    Like get_players_by_name, but selects only the given columns and returns
+    each player as a dict of them. `index` is a search index the caller
+    already brought up to date (see player_search.refresh_search_index).
+    """
+    ids = search_player_ids(session, name, index=index)
+    if not ids:
+        return []
+    statement = select(*[getattr(Player, field) for field in fields]).where(Player.id.in_(ids))
+    rows = {row["id"]: dict(row) for row in session.exec(statement).mappings()}
+    return [rows[player_id] for player_id in ids if player_id in rows]
 
 def get_player_by_id(session: Session, player_id: int) -> Player:
     """
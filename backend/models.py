@@ -1,6 +1,7 @@
-from typing import Optional
+from typing import Dict, List, Optional
 from sqlmodel import Field, SQLModel, Column
 from sqlalchemy import JSON
+from pydantic import ConfigDict
 
 # Player Data - Corresponds to current_players_2425.csv
 class PlayerBase(SQLModel):
@@ -119,6 +120,88 @@ class PlayerPrediction(SQLModel, table=True):
     
     # Metadata
     computed_at: str
+    # What produced the row: fingerprint of the player's simulation inputs
+    # (predictor.inputFingerprints) and of the model bundle; rows where either
+    # no longer matches are recomputed by `compute_predictions.py --recompute stale`
+    feature_hash: Optional[str] = None
+    model_fingerprint: Optional[str] = None
+
+class PredictionVersion(SQLModel, table=True):
+    """
+    One generation of pre-computed predictions, stored in its own table
+    (player_predictions_v<id>, see prediction_versions.py).
+    status: staging (being written), active (read by the API), ready (kept
+    for rollback), rolled_back (replaced by a rollback, dropped at a later
+    activation) or retired (table dropped). deactivated_at is when it stopped
+    being active; its table is kept while readers may still use it.
+    """
+    __tablename__ = "prediction_versions"
+    __table_args__ = {"schema": "fut"}
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    status: str = Field(default="staging", index=True)
+    source_version: Optional[int] = None
+    model_fingerprint: Optional[str] = None
+    row_count: Optional[int] = None
+    created_at: str
+    activated_at: Optional[str] = None
+    deactivated_at: Optional[str] = None
 
 class PlayerRead(PlayerBase):
-    id: int
\ No newline at end of file
+    id: int
+
+class PlayerSummary(SQLModel):
+    """What the search dropdown needs to show and select a player (/searchPlayers default)"""
+    id: int
+    name: str
+    nationality_name: str
+    age_fifa: int
+    player_positions: str
+    pos: str
+    overall: int
+    value_eur: Optional[float] = None
+    club_name: Optional[str] = None
+
+class BulkPredictionRequest(SQLModel):
+    """Body of POST /predictPlayers: up to BULK_PREDICTION_MAX_IDS player IDs"""
+    player_ids: List[int]
+
+class SimulationBase(SQLModel):
+    """
+    Inputs shared by the simulation endpoints. Either player_id (start from a
+    stored player) or features (every model feature plus value_eur) must be
+    given; overrides replace individual values. year_overrides edit the
+    inputs of a later simulated year ({year: {feature: value}}, years 1-9),
+    re-running only the seasons from that year on. Keys may use model or
+    database column names.
+    """
+    player_id: Optional[int] = None
+    features: Optional[Dict[str, float]] = None
+    overrides: Dict[str, float] = Field(default_factory=dict)
+    year_overrides: Dict[int, Dict[str, float]] = Field(default_factory=dict)
+    pos: Optional[str] = None
+    player_positions: Optional[str] = None
+
+
+class SimulationRequest(SimulationBase):
+    """
+    Body of POST /simulatePlayer. samples > 0 adds uncertainty bands from
+    that many perturbed rollouts.
+    """
+    # Monte Carlo rollouts for p10/p50/p90 bands (0 = deterministic path only)
+    samples: int = 0
+    seed: Optional[int] = None
+
+
+class SimulationStreamRequest(SimulationBase):
+    """
+    Body of POST /simulatePlayer/stream: the simulation inputs plus how far
+    to simulate and when a player's career ends early. The stream has no
+    Monte Carlo bands, so unknown fields (such as samples) are rejected
+    rather than silently ignored.
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    horizon: int = 9
+    retirement_age: Optional[int] = None
+    stop_at_zero_minutes: bool = False
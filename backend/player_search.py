@@ -0,0 +1,238 @@
+"""
+In-memory player name search for the frontend typeahead.
+Names are folded (accents stripped, lower-cased, punctuation as spaces), so
+"Mbappe" finds "Mbappé". The index keeps the folded names and their words
+sorted for prefix lookups and maps every trigram to the players containing
+it, so a query only touches the players that can match instead of scanning
+the table with ILIKE '%name%'. Results are ranked by match quality (whole
+name, name prefix, whole word, word prefix, substring, then names sharing
+most trigrams, for typos) and then by overall rating.
+The index is built on the first search and rebuilt when the players table
+changes (row count or highest id, checked every SEARCH_INDEX_CHECK_SECONDS).
+"""
+import asyncio
+import bisect
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+import numpy as np
+from sqlmodel import select
+from sqlalchemy import func
+from config import settings
+from models import Player
+
+_separators = re.compile(r"[^0-9a-z]+")
+# Letters NFKD does not split into a base letter and an accent
+_letters = str.maketrans({"ø": "o", "đ": "d", "ð": "d", "ł": "l", "ı": "i", "ß": "ss",
+                          "æ": "ae", "œ": "oe", "þ": "th", "ħ": "h"})
+
+
+def fold(text):
+    """Accent-free, lower-case form of a name with single spaces between words"""
+    if not text:
+        return ""
+    text = text.casefold()
+    if not text.isascii():
+        # Decompose accented letters and drop the accents (and anything else non-ASCII)
+        text = unicodedata.normalize("NFKD", text.translate(_letters)).encode("ascii", "ignore").decode()
+    return _separators.sub(" ", text).strip()
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _sorted_pairs(texts, entries):
+    """Strings sorted, with the entry of each string in an aligned array"""
+    order = sorted(range(len(texts)), key=texts.__getitem__)
+    return [texts[i] for i in order], np.array(entries, dtype=np.int64)[order]
+
+
+def _prefix_range(texts, prefix):
+    return bisect.bisect_left(texts, prefix), bisect.bisect_left(texts, prefix + "\uffff")
+
+
+class PlayerSearchIndex:
+    def __init__(self, rows):
+        """
+        rows: (id, name, long_name, overall) per player. Entries are numbered
+        by overall, best first, so any sorted set of entries is in rank order.
+        """
+        rows = sorted(rows, key=lambda row: -(row[3] or 0))
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.keys = []  # folded (name, long_name) per entry
+        names, name_entries, words, word_entries = [], [], [], []
+        postings = defaultdict(list)
+        for entry, (_, name, long_name, _) in enumerate(rows):
+            keys = (fold(name), fold(long_name))
+            self.keys.append(keys)
+            for key in dict.fromkeys(keys):
+                names.append(key)
+                name_entries.append(entry)
+            for word in dict.fromkeys(keys[0].split() + keys[1].split()):
+                words.append(word)
+                word_entries.append(entry)
+            for gram in trigrams(keys[0]) | trigrams(keys[1]):
+                postings[gram].append(entry)
+        self.names, self.name_entries = _sorted_pairs(names, name_entries)
+        self.words, self.word_entries = _sorted_pairs(words, word_entries)
+        self.postings = {gram: np.array(entries, dtype=np.int64) for gram, entries in postings.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _substring_candidates(self, grams):
+        """Entries containing every trigram of the query"""
+        lists = [self.postings.get(gram) for gram in grams]
+        if any(entries is None for entries in lists):
+            return np.empty(0, dtype=np.int64)
+        lists.sort(key=len)
+        candidates = lists[0]
+        for entries in lists[1:]:
+            candidates = np.intersect1d(candidates, entries, assume_unique=True)
+        return candidates
+
+    def _fuzzy_candidates(self, grams):
+        """Entries sharing at least SEARCH_FUZZY_THRESHOLD of the query's trigrams, most shared first"""
+        present = [entries for entries in (self.postings.get(gram) for gram in grams) if entries is not None]
+        if not present:
+            return np.empty(0, dtype=np.int64)
+        counts = np.bincount(np.concatenate(present))
+        candidates = np.flatnonzero(counts >= settings.SEARCH_FUZZY_THRESHOLD * len(grams))
+        # Stable sort keeps the rank order among equally close names
+        return candidates[np.argsort(-counts[candidates], kind="stable")]
+
+    def search(self, query, limit):
+        """
+        Player ids best matching `query`, at most `limit`. Matches are taken
+        tier by tier (whole name, name prefix, whole word, word prefix,
+        substring, fuzzy), each by overall, until `limit` are found.
+        """
+        query = fold(query)
+        if not query or not len(self) or limit <= 0:
+            return []
+        found = {}  # entry -> None, in result order
+
+        def take(entries, accept=None, ranked=False):
+            if not ranked:
+                entries = np.unique(entries)
+            for entry in entries.tolist():
+                if entry not in found and (accept is None or accept(entry)):
+                    found[entry] = None
+                    if len(found) >= limit:
+                        return True
+            return False
+
+        start, end = _prefix_range(self.names, query)
+        whole = bisect.bisect_right(self.names, query, start, end)
+        if take(self.name_entries[start:whole]) or take(self.name_entries[whole:end]):
+            return self.ids[list(found)].tolist()
+
+        # Words: a one-word query is looked up directly; for longer ones the
+        # first word narrows the candidates and the whole query is checked
+        first, _, rest = query.partition(" ")
+        padded = f" {query}"
+        in_name = (lambda entry: any(padded in f" {key}" for key in self.keys[entry])) if rest else None
+        start, end = _prefix_range(self.words, first)
+        whole = bisect.bisect_right(self.words, first, start, end)
+        if rest:
+            # Only the first word's exact form can be followed by the next word
+            end = whole
+        if take(self.word_entries[start:whole], in_name) or take(self.word_entries[whole:end], in_name):
+            return self.ids[list(found)].tolist()
+
+        grams = trigrams(query)
+        if grams:
+            contains = lambda entry: any(query in key for key in self.keys[entry])
+            if take(self._substring_candidates(grams), contains):
+                return self.ids[list(found)].tolist()
+        if len(grams) >= 3:
+            # Typos: names sharing most of the query's trigrams
+            take(self._fuzzy_candidates(grams), ranked=True)
+        return self.ids[list(found)].tolist()
+
+
+_index = None        # PlayerSearchIndex
+_signature = None    # (row count, highest id) the index was built from
+_checked = 0.0
+_indexLock = threading.Lock()
+
+
+def _table_signature(session):
+    return tuple(session.exec(select(func.count(Player.id), func.max(Player.id))).one())
+
+
+def _index_rows(session):
+    return session.exec(select(Player.id, Player.name, Player.long_name, Player.overall)).all()
+
+
+def _due_check():
+    """
+    (index, signature it was built from, whether the table should be checked).
+    A due check is claimed, so other requests keep using the current index
+    meanwhile. No lock is held while querying: on the async endpoints the
+    queries run in the event loop's greenlet, and a thread lock held across
+    them would block every other request on the loop. Concurrent rebuilds
+    just race to swap in an equivalent index.
+    """
+    global _checked
+    with _indexLock:
+        if _index is not None:
+            if time.monotonic() - _checked < settings.SEARCH_INDEX_CHECK_SECONDS:
+                return _index, _signature, False
+            _checked = time.monotonic()
+        return _index, _signature, True
+
+
+def _install(index, signature, started):
+    global _index, _signature, _checked
+    with _indexLock:
+        _index, _signature, _checked = index, signature, time.monotonic()
+    print(f"Built player search index: {len(index)} players in "
+          f"{(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+def search_index(session):
+    """
+    The current index, (re)built when the players table changed since it was
+    built. The table is checked at most every SEARCH_INDEX_CHECK_SECONDS.
+    """
+    index, signature, due = _due_check()
+    if not due:
+        return index
+    current = _table_signature(session)
+    if index is not None and current == signature:
+        return index
+    started = time.perf_counter()
+    index = PlayerSearchIndex(_index_rows(session))
+    _install(index, current, started)
+    return index
+
+
+async def refresh_search_index(session):
+    """
+    search_index for the async endpoints (`session` is an AsyncSession). The
+    queries run on the session, but the index is built on a worker thread:
+    folding every name takes seconds for a large table, and on the event loop
+    no other request could be served meanwhile.
+    """
+    index, signature, due = _due_check()
+    if not due:
+        return index
+    current = await session.run_sync(_table_signature)
+    if index is not None and current == signature:
+        return index
+    started = time.perf_counter()
+    rows = await session.run_sync(_index_rows)
+    index = await asyncio.get_running_loop().run_in_executor(None, PlayerSearchIndex, rows)
+    _install(index, current, started)
+    return index
+
+
+def search_player_ids(session, name, limit=None, index=None):
+    """Ids of the players best matching `name`, best first (in `index` if given)"""
+    if index is None:
+        index = search_index(session)
+    return index.search(name, limit or settings.SEARCH_RESULTS_LIMIT)
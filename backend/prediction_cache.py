@@ -0,0 +1,95 @@
+"""
+Size-bounded LRU cache with expiry for simulation results.
+Keys are content hashes of the simulation input (see predictor.predictionCacheKey),
+so the same player with the same features and models always maps to one entry.
+"""
+import collections
+import hashlib
+import threading
+import time
+import metrics
+
+
+def content_key(*parts):
+    """sha256 over a sequence of bytes/str parts, with separators so parts can't run together"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()
+        digest.update(len(part).to_bytes(8, 'little'))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    LRU cache of computed results.
+    - max_entries: entries kept before the least recently used is evicted (0 disables the cache)
+    - ttl_seconds: entries older than this are treated as misses (0 = never expire)
+    """
+
+    def __init__(self, max_entries=4096, ttl_seconds=0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = collections.OrderedDict()  # key -> (stored at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Cached value for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+                    del self._entries[key]
+                    self.expirations += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    metrics.record_cache_lookup(True)
+                    return value
+            self.misses += 1
+        metrics.record_cache_lookup(False)
+        return None
+
+    def put(self, key, value):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value, or compute, store and return it"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
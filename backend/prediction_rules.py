@@ -0,0 +1,355 @@
+"""
+Vectorized versions of the post-prediction rules in predictor.py.
+Every function takes NumPy arrays (one entry per player) and mirrors the
+scalar FixOverall / FixMomentum / FixValue / FixAttributes and G/A floor
+logic branch for branch, using masks and lookup tables instead of if/elif.
+check_rules.py compares these against the scalar functions.
+"""
+import numpy as np
+
+# Face stats in the order FixAttributes walks them
+ATTRIBUTE_STATS = ['physic', 'defending', 'dribbling', 'passing', 'shooting', 'pace']
+
+# Position groups for G/A expectations, in priority order
+POSITION_NONE, POSITION_FORWARD, POSITION_WINGER, POSITION_ATTACKING_MID, POSITION_MIDFIELDER = range(5)
+
+# Expected G/A per 90 by position group: (goals at 70 OVR, goals per OVR, assists at 70 OVR, assists per OVR)
+# Forwards: 70 OVR = 0.15/0.08, 95 OVR = 0.70/0.35 (goals-focused)
+# Wingers: 70 OVR = 0.20/0.18, 95 OVR = 0.65/0.60 (balanced)
+# CAMs: 70 OVR = 0.20/0.24, 95 OVR = 0.60/0.70 (assists-focused)
+# CMs: 70 OVR = 0.04/0.08, 95 OVR = 0.30/0.425 (support)
+GA_RATES = np.array([
+    [0.0, 0.0, 0.0, 0.0],
+    [0.15, 0.022, 0.08, 0.0108],
+    [0.20, 0.018, 0.18, 0.0168],
+    [0.20, 0.016, 0.24, 0.0184],
+    [0.04, 0.0104, 0.08, 0.0138],
+])
+
+# Career arc G/A multipliers for ages up to 31 (<=19 uses the age-19 entry)
+AGE_MULTIPLIERS = {
+    19: 0.88, 20: 0.92, 21: 0.95, 22: 0.97, 23: 0.99, 24: 1.01,
+    25: 1.04, 26: 1.04, 27: 1.02, 28: 1.00, 29: 0.97, 30: 0.94, 31: 0.91,
+}
+
+# FixValue lookup tables, highest threshold first
+VALUE_GROWTH_TIERS = [(150_000_000, 0.04), (100_000_000, 0.06), (50_000_000, 0.08), (20_000_000, 0.18), (10_000_000, 0.30)]
+EXPECTED_VALUE_TIERS = [(90, 80_000_000), (88, 60_000_000), (85, 40_000_000), (82, 25_000_000), (80, 15_000_000), (78, 8_000_000), (75, 4_000_000)]
+
+
+def positionGroup(position, player_positions):
+    """Position group for one player (same substring checks as predictStats)"""
+    combined_position = f"{position} {player_positions}".upper()
+    is_attacking_mid = any(x in combined_position for x in ['CAM', 'AM'])
+    is_winger = any(x in combined_position for x in ['LW', 'RW', 'LM', 'RM'])
+    is_forward = any(x in combined_position for x in ['FW', 'ST', 'CF']) and not is_attacking_mid
+    is_midfielder = any(x in combined_position for x in ['CM', 'CDM']) and not is_attacking_mid and not is_winger
+    if is_forward:
+        return POSITION_FORWARD
+    if is_winger:
+        return POSITION_WINGER
+    if is_attacking_mid:
+        return POSITION_ATTACKING_MID
+    if is_midfielder:
+        return POSITION_MIDFIELDER
+    return POSITION_NONE
+
+def positionGroups(pos, player_positions):
+    """Position group per player; computed once per simulation since positions never change"""
+    return np.array([positionGroup(p, pp) for p, pp in zip(pos, player_positions)], dtype=np.int64)
+
+def ageMultiplierBatch(age):
+    """G/A career arc multiplier per player (int ages)"""
+    lookup = np.array([AGE_MULTIPLIERS[a] for a in range(19, 32)])
+    multiplier = lookup[np.clip(age, 19, 31) - 19]
+    multiplier = np.where((age >= 32) & (age <= 34), 0.88 - (age - 32) * 0.03, multiplier)
+    return np.where(age >= 35, 0.79 - (age - 35) * 0.04, multiplier)
+
+def _tiered(values, tiers, default):
+    """Pick the result of the first (threshold, result) tier that `values` reaches"""
+    return np.select([values >= threshold for threshold, _ in tiers], [result for _, result in tiers], default)
+
+
+def FixOverallBatch(current, change, age, potential):
+    """Vectorized FixOverall. Returns (predictOverall, predictChange) arrays."""
+    change = change.astype(float).copy()
+    gap = potential - current
+
+    # Youth/prime players (under 30): smart growth logic
+    youth = age < 30
+    far = youth & (gap >= 5)
+    change = np.where(far & (change < 2), np.maximum(2, np.minimum(4, gap * 0.5)), change)
+    change = np.where(far, np.minimum(change, 4), change)
+
+    medium = youth & (gap >= 3) & (gap < 5)
+    change = np.where(medium & (change < 1), np.maximum(1, np.minimum(3, gap * 0.6)), change)
+    change = np.where(medium, np.minimum(change, 3), change)
+
+    close = youth & (gap >= 1) & (gap < 3)
+    change = np.where(close & (change < 0), np.maximum(0, np.minimum(2, gap)), change)
+    change = np.where(close, np.minimum(change, gap + 1), change)
+
+    at_potential = youth & (gap < 1)
+    prime = at_potential & (age < 28)
+    near = prime & ((current == potential) | (current == potential - 1) | (current == potential - 2))
+    above = prime & ~near & (current > potential)
+    late_prime = at_potential & (age >= 28)
+    change = np.select(
+        [near & (change <= -2), near & (change >= 3),
+         above & (change >= 2), above & (change <= -2),
+         late_prime & (change >= 3), late_prime & (change <= -3)],
+        [-1, 2, 1, -1, 2, -2],
+        change,
+    )
+
+    # Veterans (30-34): decline bias, elite (85+) hold form better
+    veteran = (age >= 30) & (age < 35)
+    elite = current >= 85
+    vet_elite = veteran & elite
+    vet_regular = veteran & ~elite
+    # Very old players (35+): stronger decline bias
+    old = age >= 35
+    old_elite = old & elite
+    old_regular = old & ~elite
+    change = np.select(
+        [vet_elite & (change >= 2), vet_elite & (change >= 0.5), vet_elite & (change >= 0.1),
+         vet_elite & (change >= -0.2), vet_elite & (change <= -3),
+         vet_regular & (change >= 2), vet_regular & (change >= 0.7), vet_regular & (change >= 0.2),
+         vet_regular & (change >= -0.2), vet_regular & (change <= -3),
+         old_elite & (change >= 2), old_elite & (change > 0), old_elite & (change > -0.5), old_elite & (change <= -4),
+         old_regular & (change >= 1), old_regular & (change > -0.5), old_regular & (change <= -4)],
+        [1, 1, 0, -1, -2,
+         1, 1, 0, -1, -2,
+         0, -1, -1, -2,
+         -1, -1, -3],
+        change,
+    )
+
+    # Round the change, then diminishing returns for elite players
+    predictChange = np.round(change)
+    growing = predictChange > 0
+    predictChange = np.select(
+        [growing & (current >= 92), growing & (current >= 90), growing & (current >= 88), growing & (current >= 85)],
+        [np.minimum(np.round(predictChange * 0.4), 1), np.minimum(predictChange, 1),
+         np.minimum(predictChange, 2), np.minimum(predictChange, 3)],
+        predictChange,
+    )
+
+    predictOverall = current + predictChange
+    # Soft cap at 93 - only GOAT tier players reach this
+    capped = predictOverall > 93
+    predictOverall = np.where(capped, 93.0, predictOverall)
+    predictChange = np.where(capped, predictOverall - current, predictChange)
+    return predictOverall, predictChange
+
+def FixMomentumBatch(momentum, ratingChange, ovr):
+    """Vectorized FixMomentum. Returns (predictChange, predictOverall) arrays."""
+    predictChange = np.where(ratingChange < 0, np.round(momentum * .05), ratingChange)
+    predictOverall = np.ceil(ovr + predictChange)
+    return predictChange, predictOverall
+
+def FixValueBatch(age, valueEur, ratingChange, predictedVal, overall):
+    """Vectorized FixValue. Returns the adjusted value array."""
+    # Rating increased significantly: grow value with diminishing returns on expensive players
+    growth_multiplier = np.select([valueEur > threshold for threshold, _ in VALUE_GROWTH_TIERS],
+                                  [multiplier for _, multiplier in VALUE_GROWTH_TIERS], 0.50)
+    grown = valueEur + (np.sqrt(np.maximum(ratingChange, 0)) * (growth_multiplier * valueEur))
+    # Rating decreased: gentle penalty, elite players (>€80M) lose value slower
+    decline_rate = np.where(valueEur > 80_000_000, 0.03, 0.05)
+    declined = valueEur - (np.sqrt(np.abs(ratingChange)) * (decline_rate * valueEur))
+    # Minor rating changes: blend 70% model, 30% current value, cap decline for 85+ players
+    blended = (predictedVal * 0.7) + (valueEur * 0.3)
+    min_value = valueEur - valueEur * 0.15
+    hold_elite = (overall >= 85) & (ratingChange >= 0) & (blended < valueEur) & (blended < min_value)
+    blended = np.where(hold_elite, min_value, blended)
+
+    predictedVal = np.select(
+        [ratingChange >= 1, ratingChange <= -1, (ratingChange > -1) & (ratingChange < 1)],
+        [grown, declined, blended],
+        predictedVal,
+    )
+
+    # Minimum value floor by overall (young/prime players only)
+    young = age < 30
+    expected_value = np.where(young, _tiered(overall, EXPECTED_VALUE_TIERS, 0), 0)
+    predictedVal = np.where(young & (predictedVal < expected_value), expected_value, predictedVal)
+
+    # Youth premium for undervalued young players, decay for expensive older players
+    premium = age <= 23
+    premium &= (predictedVal > 5_000_000) & (predictedVal < expected_value * 0.7)
+    youth_premium = np.select([age <= 20, age <= 22], [1.25, 1.18], 1.12)
+    aging_33 = ~premium & (age >= 33) & (predictedVal > 20_000_000)
+    aging_30 = ~premium & ~aging_33 & (age >= 30) & (predictedVal > 10_000_000)
+    elite = overall >= 90
+    decay_33 = np.power(np.where(elite, 0.94, 0.88), age - 33)
+    decay_30 = np.power(np.where(elite, 0.96, 0.92), age - 30)
+    predictedVal = np.select([premium, aging_33, aging_30],
+                             [predictedVal * youth_premium, predictedVal * decay_33, predictedVal * decay_30],
+                             predictedVal)
+
+    # Elite player prime years boost (only when below €150M)
+    undervalued = elite & (predictedVal < 150_000_000)
+    prime_boost = np.select([overall >= 93, overall >= 91], [1.20, 1.15], 1.10)
+    late_boost = np.select([overall >= 93, overall >= 91], [1.10, 1.06], 1.03)
+    in_prime = undervalued & (age >= 21) & (age <= 28)
+    late_prime = undervalued & (age >= 29) & (age <= 30)
+    predictedVal = np.select([in_prime, late_prime],
+                             [predictedVal * prime_boost, predictedVal * late_boost],
+                             predictedVal)
+
+    # Value shouldn't increase when rating drops
+    predictedVal = np.where((ratingChange < 0) & (predictedVal > valueEur), valueEur * 0.97, predictedVal)
+
+    # Absolute floor: no player below €500k
+    return np.maximum(predictedVal, 500_000)
+
+def FixAttributesBatch(stats, ovr):
+    """
+    Vectorized FixAttributes.
+    `stats` is N x 6 in ATTRIBUTE_STATS order (NaN for a missing stat), `ovr` the overall per player.
+    Returns (adjusted stats, mask of rows that were adjusted and rounded).
+    """
+    n = stats.shape[0]
+    valid = ~np.isnan(stats)
+    values = np.where(valid, stats, ovr[:, None])
+    at_or_above = (valid & (stats >= ovr[:, None])).sum(axis=1)
+
+    gaps = np.maximum(0, ovr[:, None] - values)
+    has_gap = gaps > 0
+    gap_count = has_gap.sum(axis=1)
+    # Stats with a gap sorted by gap (smallest first), ties keep stat order
+    order = np.argsort(np.where(has_gap, gaps, np.inf), axis=1, kind='stable')
+    rows = np.arange(n)
+    first, second = order[:, 0], order[:, 1]
+
+    one_at_ovr = at_or_above == 1
+    none_at_ovr = at_or_above == 0
+    adjust = (gap_count > 0) & (one_at_ovr | (none_at_ovr & (gap_count >= 2)))
+
+    # 1 stat at OVR: distribute the next closest gap; 0 stats: boost 2 closest with exponential scaling
+    gap_total = gaps[:, 0] + gaps[:, 1] + gaps[:, 2] + gaps[:, 3] + gaps[:, 4] + gaps[:, 5]
+    avg_gap = gap_total / np.maximum(gap_count, 1)
+    boost_factor = 1 + (np.power(avg_gap / 8, 1.3) * 0.2)
+    gap_sum = gaps[rows, first] + gaps[rows, second]
+    remaining = np.where(one_at_ovr, np.ceil(gaps[rows, first]), np.ceil(gap_sum * 0.7 * boost_factor))
+    remaining = np.where(adjust, remaining, 0)
+
+    # Priority stats (1 or 2 per row) get 2 points a round, every other stat 1 point,
+    # walked in the same order as the scalar loop; graduated priority stats join the end
+    priority = np.stack([first, np.where(one_at_ovr, -1, second)], axis=1)
+    is_priority = np.zeros((n, 6), dtype=bool)
+    is_priority[rows, first] = True
+    is_priority[rows[~one_at_ovr], second[~one_at_ovr]] = True
+    others = np.full((n, 6), -1)
+    other_count = np.zeros(n, dtype=np.int64)
+    for s in range(6):
+        add = ~is_priority[:, s]
+        others[rows[add], other_count[add]] = s
+        other_count += add
+
+    while (remaining > 0).any():
+        for slot in range(2):
+            stat = priority[:, slot]
+            give = (remaining > 0) & (stat >= 0)
+            idx = rows[give]
+            points = np.minimum(2, remaining[give])
+            values[idx, stat[give]] += points
+            remaining[give] -= points
+            graduated = give.copy()
+            graduated[give] = values[idx, stat[give]] >= ovr[give]
+            others[rows[graduated], other_count[graduated]] = stat[graduated]
+            other_count += graduated
+            priority[graduated, slot] = -1
+        for position in range(6):
+            give = (remaining > 0) & (position < other_count)
+            stat = others[give, position]
+            values[rows[give], stat] += 1
+            remaining[give] -= 1
+
+    return np.where(adjust[:, None], np.round(values), stats), adjust
+
+def applyPredictionRulesBatch(predictions, state):
+    """
+    Vectorized applyPredictionRules for one season of every player in a SimulationState.
+    `predictions` maps task name -> array of raw model outputs (None if the model failed).
+    Returns ({result key: array}, mask of players whose face stats were rounded by FixAttributes).
+    """
+    n = len(state)
+    columns = state.column
+    position_groups = state.position_groups
+    player_value_eur = columns('value_eur')
+
+    def prediction(task_name, default):
+        values = predictions.get(task_name)
+        return np.asarray(values, dtype=float) if values is not None else np.full(n, default, dtype=float)
+
+    if predictions.get('predictOverall') is None or predictions.get('predictValue') is None:
+        raise ValueError("predictOverall and predictValue models are required for the rule layer")
+    if np.isnan(player_value_eur).any():
+        raise ValueError("value_eur is missing for at least one player")
+
+    playing_time_min = columns('Playing Time_Min')
+    overall = columns('overall')
+    age = columns('age_fifa').astype(np.int64)
+    raw_change = prediction('predictRatingChange', 0.0)
+
+    # Expected G/A from position and predicted final overall (before FixOverall adjusts it)
+    estimated_final_ovr = overall + raw_change
+    rates = GA_RATES[position_groups]
+    expected_g90 = rates[:, 0] + (estimated_final_ovr - 70) * rates[:, 1]
+    expected_a90 = rates[:, 2] + (estimated_final_ovr - 70) * rates[:, 3]
+
+    # Age-based career arc then form (rating change, capped at ±15%)
+    has_group = position_groups != POSITION_NONE
+    age_multiplier = np.where(has_group, ageMultiplierBatch(age), 1.0)
+    rating_multiplier = np.clip(1.0 + (raw_change * 0.05), 0.85, 1.15)
+    g90_value = prediction('predictG90', 0.0) * age_multiplier * rating_multiplier
+    a90_value = prediction('predictA90', 0.0) * age_multiplier * rating_multiplier
+
+    # Floors: 85% of age-adjusted expected goals, 80% for assists
+    g90_floor = expected_g90 * age_multiplier * 0.85
+    a90_floor = expected_a90 * age_multiplier * 0.80
+    g90_value = np.where(has_group & (g90_value < g90_floor), g90_floor, g90_value)
+    a90_value = np.where(has_group & (a90_value < a90_floor), a90_floor, a90_value)
+
+    # Low-minute players use predicted minutes (capped at ~28 full games) for totals
+    predicted_minutes = prediction('predictMin', np.nan)
+    predicted_minutes = np.where(np.isnan(predicted_minutes), playing_time_min, predicted_minutes)
+    minutes_for_totals = np.where(playing_time_min < 900, np.minimum(predicted_minutes, 2500), playing_time_min)
+    has_minutes = minutes_for_totals > 0
+
+    def total(per90):
+        return np.where(has_minutes, per90 * (minutes_for_totals / 90), 0.0)
+
+    results = {task_name: prediction(task_name, np.nan) for task_name in
+               ['predictPace', 'predictShooting', 'predictPassing', 'predictDribbling', 'predictPhysic',
+                'predictDefending', 'predictOverall', 'predictValue', 'predictMin']}
+    results['predictedGoals'] = total(g90_value)
+    results['predictedAssists'] = total(a90_value)
+    results['predictedInterceptions'] = total(prediction('predictInt90', 0.0))
+    results['predictedTackles'] = total(prediction('predictTkl90', 0.0))
+    results['predictedKeyPasses'] = total(prediction('predictKey90', 0.0))
+    results['predictedPotential'] = prediction('predictPotential', np.nan)
+    results['predictedMinutes'] = predicted_minutes
+
+    # Overall & change: momentum fix when momentum is very high, otherwise FixOverall
+    momentum = columns('rating_momentum')
+    current_overall = np.ceil(overall)
+    momentum_change, momentum_overall = FixMomentumBatch(momentum, raw_change, current_overall)
+    fixed_overall, fixed_change = FixOverallBatch(current_overall, results['predictOverall'] - current_overall,
+                                                  age, columns('original_potential'))
+    high_momentum = momentum > 10
+    results['predictRatingChange'] = np.where(high_momentum, momentum_change, fixed_change)
+    results['predictOverall'] = np.where(high_momentum, momentum_overall, fixed_overall)
+
+    # Value fix | for old players and improper increase/decrease
+    results['predictValue'] = FixValueBatch(age, player_value_eur, results['predictRatingChange'],
+                                            np.trunc(results['predictValue']), overall)
+
+    # Attribute fix | at least 2 face stats close to overall
+    stats = np.stack([results[f'predict{s.capitalize()}'] for s in ATTRIBUTE_STATS], axis=1)
+    fixed_stats, adjusted = FixAttributesBatch(stats, results['predictOverall'])
+    for i, s in enumerate(ATTRIBUTE_STATS):
+        results[f'predict{s.capitalize()}'] = fixed_stats[:, i]
+
+    return results, adjusted
@@ -0,0 +1,102 @@
+"""
+Stored (pre-computed) predictions for the API.
+A /predictPlayer response is built from one joined query over the player and
+the active prediction version, encoded once with orjson, and kept as bytes in
+an LRU keyed by (player id, prediction version). Requests for a hot player are
+answered from memory without touching the database or re-serializing nine
+seasons of stats; activating a new version changes the key, so responses
+never mix versions.
+Responses carry a weak ETag (a hash of the encoded body, so it changes
+exactly when a new version or an edited player changes the payload; weak
+because the gzipped and identity bodies share it) and a Cache-Control
+max-age. A GET revalidating with If-None-Match gets a bodiless 304 when
+nothing changed; other methods get 412 Precondition Failed, as RFC 9110
+requires.
+"""
+import orjson
+from fastapi.responses import JSONResponse, Response
+from sqlmodel import select
+from config import settings
+from models import Player
+from prediction_cache import PredictionCache, content_key
+import prediction_versions
+
+RESPONSE_CACHE = PredictionCache(settings.RESPONSE_CACHE_SIZE, settings.RESPONSE_CACHE_TTL_SECONDS)
+
+
+def encode_json(content):
+    return orjson.dumps(content)
+
+
+def player_predictions_query(table):
+    """(Player, stats_library) rows for players with a prediction in `table`"""
+    return select(Player, table.c.stats_library).join(table, table.c.player_id == Player.id)
+
+
+def prediction_responses(session, player_ids):
+    """
+    Encoded /predictPlayer body per id ({id: bytes, or None without stored
+    predictions}). Cached bodies are reused; everything else is loaded with
+    one IN query.
+    """
+    version = prediction_versions.current_version(session)
+    bodies = {player_id: RESPONSE_CACHE.get((player_id, version)) for player_id in dict.fromkeys(player_ids)}
+    missing = [player_id for player_id, body in bodies.items() if body is None]
+    if missing:
+        table = prediction_versions.prediction_table(version)
+        for player, stats_library in session.exec(player_predictions_query(table).where(Player.id.in_(missing))):
+            body = encode_json({"player": player.model_dump(), "statsLibrary": stats_library})
+            RESPONSE_CACHE.put((player.id, version), body)
+            bodies[player.id] = body
+    return bodies
+
+
+def prediction_response(session, player_id):
+    """Encoded /predictPlayer body for a player, or None if the player has no stored predictions"""
+    return prediction_responses(session, [player_id])[player_id]
+
+
+def not_found(player_id):
+    return {"error": f"Predictions not found for player ID {player_id}"}
+
+
+def bulk_prediction_response(session, player_ids):
+    """
+    Encoded /predictPlayers body: {"results": {id: /predictPlayer body or a
+    not-found error}}, in request order, assembled from the per-player bodies.
+    """
+    bodies = prediction_responses(session, player_ids)
+    entries = [
+        encode_json(str(player_id)) + b":" + (body if body is not None else encode_json(not_found(player_id)))
+        for player_id, body in bodies.items()
+    ]
+    return b'{"results":{' + b",".join(entries) + b"}}"
+
+
+def etag(body):
+    return f'W/"{content_key(body)[:32]}"'
+
+
+def etag_matches(if_none_match, tag):
+    """Whether an If-None-Match header value lists `tag` (or is *), by weak comparison"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tag = tag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == tag for candidate in if_none_match.split(","))
+
+
+def conditional_response(body, if_none_match=None, method="GET"):
+    """
+    JSON response for an encoded body. If the client already has it, a GET
+    (or HEAD) gets 304 Not Modified and any other method 412 Precondition Failed.
+    """
+    tag = etag(body)
+    headers = {"ETag": tag, "Cache-Control": f"public, max-age={settings.HTTP_CACHE_MAX_AGE_SECONDS}"}
+    if etag_matches(if_none_match, tag):
+        if method in ("GET", "HEAD"):
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(status_code=412, headers={"ETag": tag},
+                            content={"error": "Precondition failed: If-None-Match matches the current response"})
+    return Response(content=body, media_type="application/json", headers=headers)
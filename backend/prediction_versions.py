@@ -0,0 +1,243 @@
+"""
+Versioned (blue/green) prediction tables.
+Every compute_predictions.py run writes a new staging table,
+fut.player_predictions_v<N>, and then makes it the active version in one
+transaction. Readers always query the active table, so they never see a
+half-written recompute and never contend with its writes. The previous
+versions are kept (PREDICTION_VERSIONS_KEPT) so a bad run can be rolled back
+instantly. A replaced version's table is only dropped once no reader can
+still be using it. Until the first version is activated, the original
+fut.player_predictions table is version 0 and stays active.
+"""
+import threading
+import time
+from datetime import datetime
+from sqlmodel import SQLModel, Session, select
+from sqlalchemy import ForeignKeyConstraint, Table, insert, inspect, update, func
+from config import settings
+from database import engine
+from models import PlayerPrediction, PredictionVersion
+
+LEGACY_TABLE = PlayerPrediction.__table__
+_tables = {0: LEGACY_TABLE}
+_tablesLock = threading.Lock()
+
+
+def prediction_table(version):
+    """Table holding the predictions of a version (same columns as PlayerPrediction)"""
+    with _tablesLock:
+        table = _tables.get(version)
+        if table is None:
+            # Copied columns keep index=True, so indexes are named after the new table;
+            # foreign keys are not copied with the columns and are added back here
+            table = Table(
+                f"{LEGACY_TABLE.name}_v{version}",
+                SQLModel.metadata,
+                *[column._copy() for column in LEGACY_TABLE.columns],
+                *[ForeignKeyConstraint([fk.parent.name], [fk.target_fullname]) for fk in LEGACY_TABLE.foreign_keys],
+                schema=LEGACY_TABLE.schema,
+            )
+            _tables[version] = table
+        return table
+
+
+def _drop_table(version):
+    table = prediction_table(version)
+    table.drop(engine, checkfirst=True)
+    # Forget it so a later create_all doesn't bring it back
+    with _tablesLock:
+        SQLModel.metadata.remove(table)
+        del _tables[version]
+
+
+_versionsTableExists = False
+
+
+def _versions_table_exists(session):
+    """
+    Whether fut.prediction_versions exists. The API doesn't create tables, so
+    until a versioned precompute has run there is no table and version 0 is active.
+    """
+    global _versionsTableExists
+    if not _versionsTableExists:
+        table = PredictionVersion.__table__
+        _versionsTableExists = inspect(session.connection()).has_table(table.name, schema=table.schema)
+    return _versionsTableExists
+
+
+def active_version(session):
+    """Version readers use now (0 = the original player_predictions table)"""
+    if not _versions_table_exists(session):
+        return 0
+    version = session.exec(
+        select(PredictionVersion.id)
+        .where(PredictionVersion.status == 'active')
+        .order_by(PredictionVersion.activated_at.desc())
+        .limit(1)
+    ).first()
+    return version or 0
+
+
+_active = None  # (version, checked at)
+_activeLock = threading.Lock()
+
+
+def current_version(session):
+    """
+    Active version for readers. The pointer is re-read at most every
+    PREDICTION_VERSION_CHECK_SECONDS; a replaced version is not dropped while a
+    reader may still be on it (see drop_old_versions), so it reads complete data.
+    """
+    global _active
+    with _activeLock:
+        cached = _active
+    if cached is None or time.monotonic() - cached[1] > settings.PREDICTION_VERSION_CHECK_SECONDS:
+        cached = (active_version(session), time.monotonic())
+        with _activeLock:
+            _active = cached
+    return cached[0]
+
+
+def active_table(session):
+    """Table of the active version, for readers (see current_version)"""
+    return prediction_table(current_version(session))
+
+
+def create_version(copy_from=None, model_fingerprint=None):
+    """
+    Register a staging version and create its table, optionally starting from a
+    copy of another version's rows (one INSERT ... SELECT on the server).
+    Returns the new version number.
+    """
+    with Session(engine) as session:
+        version = PredictionVersion(
+            status='staging',
+            source_version=copy_from,
+            model_fingerprint=model_fingerprint,
+            created_at=datetime.utcnow().isoformat(),
+        )
+        session.add(version)
+        session.commit()
+        number = version.id
+
+    table = prediction_table(number)
+    table.create(engine, checkfirst=True)
+    if copy_from is not None:
+        source = prediction_table(copy_from)
+        # Not the ids: the new table numbers its rows from its own sequence
+        columns = [column.name for column in source.c if not column.primary_key]
+        with engine.begin() as conn:
+            conn.execute(insert(table).from_select(columns, select(*[source.c[name] for name in columns])))
+    return number
+
+
+def discard_version(version):
+    """Drop an unfinished staging version (e.g. from an abandoned run)"""
+    _drop_table(version)
+    with Session(engine) as session:
+        record = session.get(PredictionVersion, version)
+        if record is not None:
+            record.status = 'retired'
+            session.add(record)
+            session.commit()
+
+
+def is_staging(version):
+    with Session(engine) as session:
+        record = session.get(PredictionVersion, version)
+        return record is not None and record.status == 'staging'
+
+
+def activate_version(version, previous_status='ready'):
+    """
+    Point readers at `version` in one transaction, then drop versions beyond
+    PREDICTION_VERSIONS_KEPT. The current version becomes `previous_status`:
+    'ready' (a rollback target) or 'rolled_back' (see rollback).
+    Version 0 switches back to the original table.
+    """
+    with Session(engine) as session:
+        if version:
+            record = session.get(PredictionVersion, version)
+            if record is None or record.status == 'retired':
+                raise ValueError(f"Prediction version {version} does not exist or was dropped")
+            table = prediction_table(version)
+            row_count = session.exec(select(func.count()).select_from(table)).one()
+        session.exec(
+            update(PredictionVersion).where(PredictionVersion.status == 'active')
+            .values(status=previous_status, deactivated_at=datetime.utcnow().isoformat())
+        )
+        if version:
+            session.exec(
+                update(PredictionVersion).where(PredictionVersion.id == version)
+                .values(status='active', activated_at=datetime.utcnow().isoformat(), row_count=row_count)
+            )
+        session.commit()
+    print(f"✓ Prediction version {version} is now active")
+    drop_old_versions()
+
+
+def rollback():
+    """
+    Re-activate the version that was active before the current one; returns its
+    number. The current version is marked 'rolled_back', so rolling back again
+    steps further back instead of returning to it.
+    """
+    with Session(engine) as session:
+        current = active_version(session)
+        previous = session.exec(
+            select(PredictionVersion.id)
+            .where(PredictionVersion.status == 'ready', PredictionVersion.activated_at.is_not(None))
+            .order_by(PredictionVersion.activated_at.desc())
+            .limit(1)
+        ).first()
+    if current == 0:
+        raise ValueError("The original predictions table is active, there is nothing to roll back to")
+    # No earlier activated version: fall back to the original table
+    previous = previous or 0
+    activate_version(previous, previous_status='rolled_back')
+    return previous
+
+
+def _in_use(record, now):
+    """
+    Whether API processes may still read this version: they re-read the active
+    version every PREDICTION_VERSION_CHECK_SECONDS, and queries started just
+    before that can still be running, so allow twice the interval.
+    """
+    if record.deactivated_at is None:
+        return False
+    inactive = (now - datetime.fromisoformat(record.deactivated_at)).total_seconds()
+    return inactive < 2 * settings.PREDICTION_VERSION_CHECK_SECONDS
+
+
+def drop_old_versions(keep=None):
+    """
+    Drop the tables of versions that are neither active nor among the `keep`
+    most recently active rollback targets; rolled-back versions are not kept
+    as targets. A version replaced too recently for every reader to have
+    moved on is left for a later call.
+    """
+    keep = max(1, settings.PREDICTION_VERSIONS_KEPT if keep is None else keep)
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        ready = session.exec(
+            select(PredictionVersion)
+            .where(PredictionVersion.status == 'ready')
+            .order_by(PredictionVersion.activated_at.desc())
+        ).all()
+        rolled_back = session.exec(
+            select(PredictionVersion).where(PredictionVersion.status == 'rolled_back')
+        ).all()
+        for record in ready[keep:] + rolled_back:
+            if _in_use(record, now):
+                continue
+            _drop_table(record.id)
+            record.status = 'retired'
+            session.add(record)
+            print(f"Dropped prediction version {record.id}")
+        session.commit()
+
+
+def list_versions():
+    with Session(engine) as session:
+        return session.exec(select(PredictionVersion).order_by(PredictionVersion.id)).all()
@@ -1,37 +1,354 @@
-import pickle
-import pandas as pd
+import numpy as np
 from sqlmodel import Session
 from models import Player
 import math
-from model_utils import player_to_features
+from model_utils import player_to_features, MODEL_FEATURES
+from simulation_state import SimulationState, SimulationTrajectory, COL
+from prediction_rules import applyPredictionRulesBatch, ATTRIBUTE_STATS
+from model_registry import ModelRegistry, combine_fingerprints, file_signature
+from prediction_cache import PredictionCache, content_key
+import time
+from compiled_models import CompiledModels
 import concurrent.futures
+import contextlib
+import multiprocessing
+import threading
+import atexit
 import os
+import warnings
+from config import settings
 
 # Get the absolute path to the models directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODELS_DIR = os.path.join(os.path.dirname(BASE_DIR), "models")
-
-# LOAD MODELS
-with open(os.path.join(MODELS_DIR, "faceStatsBundle.pkl"), "rb") as f:
-    MODEL_BUNDLE = pickle.load(f)
-paceModel = MODEL_BUNDLE['pace']
-shootingModel = MODEL_BUNDLE['shooting']
-passingModel = MODEL_BUNDLE['passing']
-dribblingModel = MODEL_BUNDLE['dribbling']
-defendingModel = MODEL_BUNDLE['defending']
-physicModel = MODEL_BUNDLE['physic']
-#IRL Stats Models
-key90 = pickle.load(open(os.path.join(MODELS_DIR, "key90Model.pkl"), "rb"))
-a90Model = pickle.load(open(os.path.join(MODELS_DIR, "a90Model.pkl"), "rb"))
-g90Model = pickle.load(open(os.path.join(MODELS_DIR, "g90Model.pkl"), "rb"))
-int90Model = pickle.load(open(os.path.join(MODELS_DIR, "int90Model.pkl"), "rb"))
-tkl90Model = pickle.load(open(os.path.join(MODELS_DIR, "tkl90Model.pkl"), "rb"))
-minModel = pickle.load(open(os.path.join(MODELS_DIR, "minutesModel.pkl"), "rb"))
-# Extra Fifa
-potModel = pickle.load(open(os.path.join(MODELS_DIR, "potModel.pkl"), "rb"))
-ratingChange = pickle.load(open(os.path.join(MODELS_DIR, "changeModel.pkl"), "rb"))
-overallModel = pickle.load(open(os.path.join(MODELS_DIR, "ovrModel.pkl"), "rb"))
-valModel = pickle.load(open(os.path.join(MODELS_DIR, "valModel.pkl"), "rb"))
+MODELS_DIR = settings.MODELS_DIR
+
+# Result keys of the face stats FixAttributes adjusts
+ATTRIBUTE_KEYS = {f'predict{stat.capitalize()}' for stat in ATTRIBUTE_STATS}
+
+# Task name -> (model file, key inside a bundle file)
+MODEL_TASKS = {
+    # Face Stats
+    'predictPace': ("faceStatsBundle.pkl", 'pace'),
+    'predictShooting': ("faceStatsBundle.pkl", 'shooting'),
+    'predictPassing': ("faceStatsBundle.pkl", 'passing'),
+    'predictDribbling': ("faceStatsBundle.pkl", 'dribbling'),
+    'predictPhysic': ("faceStatsBundle.pkl", 'physic'),
+    'predictDefending': ("faceStatsBundle.pkl", 'defending'),
+    # Core / Extra Fifa
+    'predictRatingChange': ("changeModel.pkl", None),
+    'predictOverall': ("ovrModel.pkl", None),
+    'predictValue': ("valModel.pkl", None),
+    'predictPotential': ("potModel.pkl", None),
+    # IRL Stats Models
+    'predictG90': ("g90Model.pkl", None),
+    'predictA90': ("a90Model.pkl", None),
+    'predictInt90': ("int90Model.pkl", None),
+    'predictTkl90': ("tkl90Model.pkl", None),
+    'predictMin': ("minutesModel.pkl", None),
+    'predictKey90': ("key90Model.pkl", None),
+}
+
+# Old module-level model names, still importable (loaded on access)
+LEGACY_MODEL_NAMES = {
+    'paceModel': 'predictPace',
+    'shootingModel': 'predictShooting',
+    'passingModel': 'predictPassing',
+    'dribblingModel': 'predictDribbling',
+    'defendingModel': 'predictDefending',
+    'physicModel': 'predictPhysic',
+    'key90': 'predictKey90',
+    'a90Model': 'predictA90',
+    'g90Model': 'predictG90',
+    'int90Model': 'predictInt90',
+    'tkl90Model': 'predictTkl90',
+    'minModel': 'predictMin',
+    'potModel': 'predictPotential',
+    'ratingChange': 'predictRatingChange',
+    'overallModel': 'predictOverall',
+    'valModel': 'predictValue',
+}
+
+def checkModelFeatures(task_name, model):
+    """
+    Verify a pickled model expects exactly MODEL_FEATURES, in order.
+    Done once at load so the hot loop can feed raw float32 arrays without
+    XGBoost re-validating (or us re-trying) feature names on every predict.
+    """
+    booster = model.get_booster()
+    feature_names = booster.feature_names
+    if feature_names is not None and list(feature_names) != MODEL_FEATURES:
+        raise ValueError(f"{task_name} model features do not match MODEL_FEATURES: {feature_names}")
+    if booster.num_features() != len(MODEL_FEATURES):
+        raise ValueError(f"{task_name} model expects {booster.num_features()} features, got {len(MODEL_FEATURES)}")
+
+def _prepareModel(task_name, model):
+    """
+    Runs once when a model is loaded: validates its features, applies the
+    thread setting and returns (booster, iteration range) for in-place prediction.
+    """
+    checkModelFeatures(task_name, model)
+    booster = model.get_booster()
+    if modelThreads is not None:
+        booster.set_param({'nthread': modelThreads if modelThreads > 0 else -1})
+    best = getattr(model, 'best_iteration', None)
+    return booster, (0, best + 1) if best is not None else (0, 0)
+
+# LOAD MODELS | lazily, on first use or via warmUpModels()
+MODEL_REGISTRY = ModelRegistry(MODELS_DIR, MODEL_TASKS, on_load=_prepareModel)
+
+# PREDICTION CACHE | simulation results keyed by their inputs and the model fingerprint
+PREDICTION_CACHE = PredictionCache(settings.PREDICTION_CACHE_SIZE, settings.PREDICTION_CACHE_TTL_SECONDS)
+
+# COMPILED MODELS | array-encoded copies of the same models (see export_models.py)
+MODEL_BACKENDS = ('xgboost', 'compiled', 'auto')
+COMPILED_MODELS_PATH = os.path.join(MODELS_DIR, settings.COMPILED_MODELS_FILE)
+modelBackend = None
+_compiledModels = None
+_compiledLock = threading.Lock()
+
+def setModelBackend(backend):
+    """Choose between the pickled XGBoost models, the compiled copies or 'auto' (compiled for small batches)"""
+    global modelBackend, _bundleFingerprint
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"Unknown model backend '{backend}', expected one of {MODEL_BACKENDS}")
+    modelBackend = backend
+    _bundleFingerprint = None
+
+def getCompiledModels():
+    """Load the compiled ensembles on first use and check they match MODEL_TASKS / MODEL_FEATURES"""
+    global _compiledModels
+    if _compiledModels is not None:
+        return _compiledModels
+    with _compiledLock:
+        if _compiledModels is None:
+            compiled = CompiledModels.load(COMPILED_MODELS_PATH)
+            if compiled.feature_names != MODEL_FEATURES:
+                raise ValueError(f"Compiled model features do not match MODEL_FEATURES: {compiled.feature_names}")
+            missing = [task_name for task_name in MODEL_TASKS if task_name not in compiled.slices]
+            if missing:
+                raise ValueError(f"Compiled models file is missing {missing}")
+            stale = [task_name for task_name in MODEL_TASKS
+                     if os.path.exists(os.path.join(MODELS_DIR, MODEL_TASKS[task_name][0]))
+                     and compiled.source_fingerprints[task_name] != MODEL_REGISTRY.fingerprint(task_name)]
+            if stale:
+                print(f"[models] WARNING compiled models are older than the pickles for {stale}, re-run export_models.py")
+            _compiledModels = compiled
+        return _compiledModels
+
+def _useCompiled(rows):
+    return modelBackend == 'compiled' or (modelBackend == 'auto' and rows <= settings.COMPILED_MAX_ROWS)
+
+def warmUpModels():
+    """Load every model the current backend uses now (e.g. at startup) and return the model stats"""
+    if modelBackend != 'compiled':
+        MODEL_REGISTRY.warm_up()
+    if modelBackend != 'xgboost':
+        getCompiledModels()
+    return modelStats()
+
+_bundleFingerprint = None
+
+def bundleFingerprint():
+    """
+    Fingerprint of the whole model set, computed once per (re)load. The compiled
+    file records the fingerprints of the pickles it was exported from, so both
+    backends agree.
+    """
+    global _bundleFingerprint
+    if _bundleFingerprint is None:
+        if modelBackend == 'compiled':
+            fingerprints = getCompiledModels().source_fingerprints
+            _bundleFingerprint = combine_fingerprints({task_name: fingerprints[task_name] for task_name in MODEL_TASKS})
+        else:
+            _bundleFingerprint = MODEL_REGISTRY.bundle_fingerprint()
+    return _bundleFingerprint
+
+def _modelFileSignatures():
+    signatures = MODEL_REGISTRY.file_signatures()
+    signatures[COMPILED_MODELS_PATH] = file_signature(COMPILED_MODELS_PATH)
+    return signatures
+
+_modelFilesSeen = _modelFileSignatures()
+_modelFilesCheckedAt = time.monotonic()
+
+def reloadModels(force=False):
+    """
+    Drop every loaded model and cached prediction if a model file changed on
+    disk (or when forced). Models are reloaded lazily on next use.
+    Returns the files that changed.
+    """
+    global _compiledModels, _bundleFingerprint, _modelFilesSeen, _modelFilesCheckedAt
+    current = _modelFileSignatures()
+    changed = [os.path.basename(path) for path in current if current[path] != _modelFilesSeen.get(path)]
+    _modelFilesCheckedAt = time.monotonic()
+    if changed or force:
+        with _compiledLock:
+            MODEL_REGISTRY.reset()
+            _compiledModels = None
+            _bundleFingerprint = None
+            _modelFilesSeen = current
+            PREDICTION_CACHE.clear()
+        # Process workers hold their own copies of the models
+        shutdownInference()
+        print(f"[models] reloading models, changed files: {changed}")
+    return changed
+
+def _checkModelFiles():
+    """Pick up retrained models at most every MODEL_CHECK_SECONDS"""
+    if settings.MODEL_CHECK_SECONDS and time.monotonic() - _modelFilesCheckedAt > settings.MODEL_CHECK_SECONDS:
+        reloadModels()
+
+def modelStats():
+    """Per-model load time, memory and fingerprint plus the bundle fingerprint and cache counters"""
+    stats = {
+        'backend': modelBackend,
+        'bundle_fingerprint': bundleFingerprint(),
+        'models': MODEL_REGISTRY.stats(),
+        'prediction_cache': PREDICTION_CACHE.stats(),
+    }
+    if _compiledModels is not None:
+        stats['compiled'] = {
+            'trees': _compiledModels.num_trees,
+            'max_depth': _compiledModels.max_depth,
+        }
+    return stats
+
+def __getattr__(name):
+    # Lazy access to the old module-level models (paceModel, MODEL_BUNDLE, ...)
+    if name in LEGACY_MODEL_NAMES:
+        return MODEL_REGISTRY.get(LEGACY_MODEL_NAMES[name])
+    if name == 'MODEL_BUNDLE':
+        return {key: MODEL_REGISTRY.get(task_name) for task_name, (filename, key) in MODEL_TASKS.items()
+                if filename == "faceStatsBundle.pkl"}
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def toModelMatrix(dfStats):
+    """Convert the model features of dfStats into one float32, C-contiguous array"""
+    return np.ascontiguousarray(dfStats[MODEL_FEATURES].to_numpy(dtype=np.float32))
+
+# INFERENCE EXECUTOR
+# One long-lived pool shared by every predictStats/predictStatsBatch call.
+# Created on first use and only rebuilt when configureInference changes it.
+INFERENCE_MODES = ('sequential', 'thread', 'process')
+inferenceMode = None
+inferenceWorkers = None
+modelThreads = None
+_executor = None
+_executorLock = threading.Lock()
+
+def setModelThreads(threads):
+    """Limit the threads each XGBoost model uses per predict (0 = XGBoost default)"""
+    global modelThreads
+    modelThreads = threads
+    for task_name in MODEL_REGISTRY.loaded_names():
+        booster, _ = MODEL_REGISTRY.prepared(task_name)
+        booster.set_param({'nthread': threads if threads > 0 else -1})
+
+def configureInference(mode=None, workers=None, threads=None):
+    """
+    Change how model inference runs:
+    - 'sequential': all models run inline in the calling thread
+    - 'thread': the 16 models fan out over a shared thread pool
+    - 'process': rows are split across a pool of worker processes
+    The current pool is shut down so the next prediction picks up the new settings.
+    """
+    global inferenceMode, inferenceWorkers, modelThreads
+    if mode is not None:
+        if mode not in INFERENCE_MODES:
+            raise ValueError(f"Unknown inference mode '{mode}', expected one of {INFERENCE_MODES}")
+        inferenceMode = mode
+    if workers is not None:
+        inferenceWorkers = max(1, workers)
+    if threads is not None:
+        modelThreads = threads
+    shutdownInference()
+    setModelThreads(modelThreads)
+
+def getExecutor():
+    """Return the shared executor for the current mode (None when sequential)"""
+    global _executor
+    if inferenceMode == 'sequential':
+        return None
+    with _executorLock:
+        if _executor is None:
+            if inferenceMode == 'process':
+                # Spawn so workers don't inherit XGBoost/OpenMP thread state from the parent
+                _executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=inferenceWorkers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=setModelThreads,
+                    initargs=(modelThreads,),
+                )
+            else:
+                _executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=inferenceWorkers,
+                    thread_name_prefix='inference',
+                )
+        return _executor
+
+def shutdownInference():
+    """Stop the shared executor (a new one is created on the next prediction)"""
+    global _executor
+    with _executorLock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+atexit.register(shutdownInference)
+
+def _predictTask(task_name, X):
+    """Run one model over every row of the float32 feature matrix X"""
+    if _useCompiled(len(X)):
+        return getCompiledModels().predict_task(task_name, X)
+    booster, iteration_range = MODEL_REGISTRY.prepared(task_name)
+    return booster.inplace_predict(X, iteration_range=iteration_range)
+
+def _predictAllTasks(X):
+    """Run every model over X in the current thread/process"""
+    predictions = {}
+    for task_name in MODEL_TASKS:
+        try:
+            predictions[task_name] = _predictTask(task_name, X)
+        except Exception as e:
+            predictions[task_name] = None
+            print(f"Error in {task_name}: {e}")
+    return predictions
+
+def runModels(X):
+    """
+    Run all 16 models over the feature matrix X (see toModelMatrix) using the configured executor.
+    Returns {task name: array of predictions, or None if that model failed}.
+    """
+    if _useCompiled(len(X)):
+        # One NumPy pass covers every model, no executor needed
+        return getCompiledModels().predict(X, MODEL_TASKS)
+
+    executor = getExecutor()
+    if executor is None:
+        return _predictAllTasks(X)
+
+    if inferenceMode == 'process':
+        # Each worker runs every model on its own slice of rows
+        slices = [idx for idx in np.array_split(np.arange(len(X)), inferenceWorkers) if len(idx)]
+        parts = [f.result() for f in [executor.submit(_predictAllTasks, X[idx]) for idx in slices]]
+        return {
+            task_name: None if any(p[task_name] is None for p in parts) else np.concatenate([p[task_name] for p in parts])
+            for task_name in MODEL_TASKS
+        }
+
+    futureToTask = {executor.submit(_predictTask, task_name, X): task_name for task_name in MODEL_TASKS}
+    predictions = {}
+    for future in concurrent.futures.as_completed(futureToTask):
+        task_name = futureToTask[future]
+        try:
+            predictions[task_name] = future.result()
+        except Exception as e:
+            predictions[task_name] = None
+            print(f"Error in {task_name}: {e}")
+    return predictions
+
+configureInference(settings.INFERENCE_MODE, settings.INFERENCE_WORKERS, settings.MODEL_THREADS)
+setModelBackend(settings.MODEL_BACKEND)
 
 
 
@@ -40,118 +357,69 @@ valModel = pickle.load(open(os.path.join(MODELS_DIR, "valModel.pkl"), "rb"))
 # Face Stats Predictions
 def predictPace(df_features) -> float:
     """Predict Pace"""
-    try:
-        return float(paceModel.predict(df_features)[0])
-    except Exception as e:
-        # Fallback: try with values only
-        return float(paceModel.predict(df_features.values)[0])
-        
+    return float(_predictTask('predictPace', toModelMatrix(df_features))[0])
+
 def predictShooting(df_features) -> float:
     """Predict Shooting"""
-    try:
-        return float(shootingModel.predict(df_features)[0])
-    except Exception as e:
-        return float(shootingModel.predict(df_features.values)[0])
-        
+    return float(_predictTask('predictShooting', toModelMatrix(df_features))[0])
+
 def predictDefending(df_features) -> float:
     """Predict Defending"""
-    try:
-        return float(defendingModel.predict(df_features)[0])
-    except Exception as e:
-        return float(defendingModel.predict(df_features.values)[0])
-        
+    return float(_predictTask('predictDefending', toModelMatrix(df_features))[0])
+
 def predictPassing(df_features) -> float:
     """Predict Passing"""
-    try:
-        return float(passingModel.predict(df_features)[0])
-    except Exception as e:
-        return float(passingModel.predict(df_features.values)[0])
-        
+    return float(_predictTask('predictPassing', toModelMatrix(df_features))[0])
+
 def predictDribbling(df_features) -> float:
     """Predict Dribbling"""
-    try:
-        return float(dribblingModel.predict(df_features)[0])
-    except Exception as e:
-        return float(dribblingModel.predict(df_features.values)[0])
-        
+    return float(_predictTask('predictDribbling', toModelMatrix(df_features))[0])
+
 def predictPhysic(df_features) -> float:
     """Predict Physic"""
-    try:
-        return float(physicModel.predict(df_features)[0])
-    except Exception as e:
-        return float(physicModel.predict(df_features.values)[0])
-        
+    return float(_predictTask('predictPhysic', toModelMatrix(df_features))[0])
+
 # Core FIFA
 def predictRatingChange(df_features) -> float:
     """Predict Overall Rating Change"""
-    try:
-        return float(ratingChange.predict(df_features)[0])
-    except Exception as e:
-        return float(ratingChange.predict(df_features.values)[0])
-        
+    return float(_predictTask('predictRatingChange', toModelMatrix(df_features))[0])
+
 def predictOverall(df_features) -> float:
     """Predict Overall Rating"""
-    try:
-        return float(overallModel.predict(df_features)[0])
-    except Exception as e:
-        return float(overallModel.predict(df_features.values)[0])
-        
+    return float(_predictTask('predictOverall', toModelMatrix(df_features))[0])
+
 def predictValue(df_features) -> float:
     """Predict Market Value EUR"""
-    try:
-        return float(valModel.predict(df_features)[0])
-    except Exception as e:
-        return float(valModel.predict(df_features.values)[0])
-        
+    return float(_predictTask('predictValue', toModelMatrix(df_features))[0])
+
 def predictPotential(df_features) -> float:
     """Predict Potential"""
-    try:
-        return float(potModel.predict(df_features)[0])
-    except Exception as e:
-        return float(potModel.predict(df_features.values)[0])
-        
+    return float(_predictTask('predictPotential', toModelMatrix(df_features))[0])
+
 # IRL Stats
 def predictG90(df_features) -> float:
     """Predict Goals per 90"""
-    try:
-        return float(g90Model.predict(df_features)[0])
-    except Exception as e:
-        return float(g90Model.predict(df_features.values)[0])
-        
+    return float(_predictTask('predictG90', toModelMatrix(df_features))[0])
+
 def predictA90(df_features) -> float:
     """Predict Assists per 90"""
-    try:
-        return float(a90Model.predict(df_features)[0])
-    except Exception as e:
-        return float(a90Model.predict(df_features.values)[0])
-        
+    return float(_predictTask('predictA90', toModelMatrix(df_features))[0])
+
 def predictInt90(df_features) -> float:
     """Predict Interceptions per 90"""
-    try:
-        return float(int90Model.predict(df_features)[0])
-    except Exception as e:
-        return float(int90Model.predict(df_features.values)[0])
-        
+    return float(_predictTask('predictInt90', toModelMatrix(df_features))[0])
+
 def predictTkl90(df_features) -> float:
     """Predict Tackles per 90"""
-    try:
-        return float(tkl90Model.predict(df_features)[0])
-    except Exception as e:
-        return float(tkl90Model.predict(df_features.values)[0])
-        
+    return float(_predictTask('predictTkl90', toModelMatrix(df_features))[0])
+
 def predictMin(df_features) -> float:
     """Predict Minutes Played"""
-    try:
-        return float(minModel.predict(df_features)[0])
-    except Exception as e:
-        return float(minModel.predict(df_features.values)[0])
-        
+    return float(_predictTask('predictMin', toModelMatrix(df_features))[0])
+
 def predictKey90(df_features) -> float:
     """Predict Key Passes per 90"""
-    try:
-        return float(key90.predict(df_features)[0])
-    except Exception as e:
-        return float(key90.predict(df_features.values)[0])
+    return float(_predictTask('predictKey90', toModelMatrix(df_features))[0])
 
 
 # Adjustment functions
@@ -553,148 +821,243 @@ def FixAttributes(results, position):
         print(f"FixAttributes error: {e}")
         return results
 
-def resultsToNextSeasonDf(currentDf, results):
+def nextSeasonState(state, seasonResults):
     """
-    Converts prediction results into a dataframe for the next season.
-    Updates all features needed for recursive predictions.
+    Converts one season of prediction results into the state for the next season.
+    Updates all features needed for recursive predictions with column operations
+    on the state matrix. `seasonResults` maps result key -> array (one per player).
     """
-    nextDf = currentDf.copy()
-    
+    current = state.matrix
+    nextMatrix = current.copy()
+    n = len(state)
+
+    def cur(name):
+        return current[:, COL[name]]
+
+    def result(key, default):
+        # Prediction for each player, falling back to `default` (array or scalar)
+        if key in seasonResults:
+            return np.asarray(seasonResults[key], dtype=float)
+        return np.broadcast_to(np.asarray(default, dtype=float), (n,))
+
+    def put(name, values):
+        nextMatrix[:, COL[name]] = values
+
     # 1. Update lag features (shift current values to lag)
-    nextDf['overall_lag1'] = currentDf['overall']
-    nextDf['age_lag1'] = currentDf['age_fifa']
-    nextDf['Playing Time_Min_lag1'] = currentDf['Playing Time_Min']
-    nextDf['Per 90 Minutes_Gls_lag1'] = currentDf['Per 90 Minutes_Gls']
-    nextDf['Per 90 Minutes_Ast_lag1'] = currentDf['Per 90 Minutes_Ast']
-    nextDf['Per 90 Minutes_G+A_lag1'] = currentDf['Per 90 Minutes_G+A']
-    nextDf['Per 90 Minutes_xG_lag1'] = currentDf['Per 90 Minutes_xG']
-    nextDf['value_eur_lag1'] = currentDf['value_eur'] if 'value_eur' in currentDf.columns else results.get('predictValue', 0)
-    
+    put('overall_lag1', cur('overall'))
+    put('age_lag1', cur('age_fifa'))
+    put('Playing Time_Min_lag1', cur('Playing Time_Min'))
+    put('Per 90 Minutes_Gls_lag1', cur('Per 90 Minutes_Gls'))
+    put('Per 90 Minutes_Ast_lag1', cur('Per 90 Minutes_Ast'))
+    put('Per 90 Minutes_G+A_lag1', cur('Per 90 Minutes_G+A'))
+    put('Per 90 Minutes_xG_lag1', cur('Per 90 Minutes_xG'))
+    predictedValue = result('predictValue', cur('value_eur'))
+    # Value only lags the current value once it has been part of the features
+    put('value_eur_lag1', np.where(state.value_known, cur('value_eur'), predictedValue))
+
     # 2. Map predictions to input columns
-    nextDf['pace'] = results.get('predictPace', currentDf['pace'].iloc[0])
-    nextDf['shooting'] = results.get('predictShooting', currentDf['shooting'].iloc[0])
-    nextDf['passing'] = results.get('predictPassing', currentDf['passing'].iloc[0])
-    nextDf['dribbling'] = results.get('predictDribbling', currentDf['dribbling'].iloc[0])
-    nextDf['defending'] = results.get('predictDefending', currentDf['defending'].iloc[0])
-    nextDf['physic'] = results.get('predictPhysic', currentDf['physic'].iloc[0])
-    nextDf['overall'] = results.get('predictOverall', currentDf['overall'].iloc[0])
-    
-    # ALWAYS preserve original potential from year 0
-    age = currentDf['age_fifa'].iloc[0]
-    current_overall = results.get('predictOverall', currentDf['overall'].iloc[0])
-    original_potential = currentDf.get('original_potential', currentDf['potential'].iloc[0])
-    if isinstance(original_potential, pd.Series):
-        original_potential = original_potential.iloc[0]
-    
+    put('pace', result('predictPace', cur('pace')))
+    put('shooting', result('predictShooting', cur('shooting')))
+    put('passing', result('predictPassing', cur('passing')))
+    put('dribbling', result('predictDribbling', cur('dribbling')))
+    put('defending', result('predictDefending', cur('defending')))
+    put('physic', result('predictPhysic', cur('physic')))
+    put('overall', result('predictOverall', cur('overall')))
+
     # Never update potential - always use original from year 0
-    nextDf['potential'] = original_potential
-    
-    # Preserve original_potential for next iteration
-    nextDf['original_potential'] = original_potential
-    
-    nextDf['value_eur'] = results.get('predictValue', currentDf['value_eur'].iloc[0] if 'value_eur' in currentDf.columns else 0)
-    
+    put('potential', cur('original_potential'))
+    put('value_eur', predictedValue)
+
     # 3. Use predicted minutes for next season if current minutes are low
-    databaseMinutes = currentDf['Playing Time_Min'].iloc[0]
-    predictedMinutes = results.get('predictedMinutes', databaseMinutes)
-    
-    # For players with low minutes, transition to predicted minutes over time
-    if databaseMinutes < 900:  # Less than 10 full games
-        # Use predicted minutes but cap reasonably
-        effectiveMinutes = min(float(predictedMinutes), 2500)
-    else:
-        effectiveMinutes = databaseMinutes
-    
-    nextDf['Playing Time_Min'] = effectiveMinutes
-    nextDf['Playing Time_90s'] = effectiveMinutes / 90 if effectiveMinutes > 0 else 0
-    
+    databaseMinutes = cur('Playing Time_Min')
+    predictedMinutes = result('predictedMinutes', databaseMinutes)
+    # Less than 10 full games: use predicted minutes but cap reasonably
+    effectiveMinutes = np.where(databaseMinutes < 900, np.minimum(predictedMinutes, 2500), databaseMinutes)
+    hasMinutes = effectiveMinutes > 0
+    safeMinutes = np.where(hasMinutes, effectiveMinutes, 1.0)
+
+    put('Playing Time_Min', effectiveMinutes)
+    put('Playing Time_90s', np.where(hasMinutes, effectiveMinutes / 90, 0))
+
     # Use effective minutes to calculate per-90 stats from predicted totals
-    if effectiveMinutes > 0:
-        nextDf['Per 90 Minutes_Gls'] = (results.get('predictedGoals', 0) / effectiveMinutes) * 90
-        nextDf['Per 90 Minutes_Ast'] = (results.get('predictedAssists', 0) / effectiveMinutes) * 90
-        nextDf['Per 90 Minutes_G+A'] = nextDf['Per 90 Minutes_Gls'] + nextDf['Per 90 Minutes_Ast']
-        nextDf['Per 90 Minutes_Tackles_Tkl'] = (results.get('predictedTackles', 0) / effectiveMinutes) * 90
-        nextDf['Per 90 Minutes_Int'] = (results.get('predictedInterceptions', 0) / effectiveMinutes) * 90
-        nextDf['Per 90 Minutes_KP'] = (results.get('predictedKeyPasses', 0) / effectiveMinutes) * 90
-    else:
-        nextDf['Per 90 Minutes_Gls'] = 0
-        nextDf['Per 90 Minutes_Ast'] = 0
-        nextDf['Per 90 Minutes_G+A'] = 0
-        nextDf['Per 90 Minutes_Tackles_Tkl'] = 0
-        nextDf['Per 90 Minutes_Int'] = 0
-        nextDf['Per 90 Minutes_KP'] = 0
-    
+    def per90(key):
+        return np.where(hasMinutes, (result(key, 0) / safeMinutes) * 90, 0)
+
+    gls90 = per90('predictedGoals')
+    ast90 = per90('predictedAssists')
+    put('Per 90 Minutes_Gls', gls90)
+    put('Per 90 Minutes_Ast', ast90)
+    put('Per 90 Minutes_G+A', gls90 + ast90)
+    put('Per 90 Minutes_Tackles_Tkl', per90('predictedTackles'))
+    put('Per 90 Minutes_Int', per90('predictedInterceptions'))
+    put('Per 90 Minutes_KP', per90('predictedKeyPasses'))
+
     # 4. Increment age
-    nextDf['age_fifa'] = currentDf['age_fifa'].iloc[0] + 1
-    
+    age = cur('age_fifa') + 1
+    put('age_fifa', age)
+
     # 5. Recalculate derived features
-    age = nextDf['age_fifa'].iloc[0]
-    nextDf['age_squared'] = age ** 2
-    nextDf['is_youth'] = 1 if age < 23 else 0
-    nextDf['is_prime'] = 1 if 23 <= age <= 29 else 0
-    nextDf['is_veteran'] = 1 if age > 29 else 0
-    
-    ovr = nextDf['overall'].iloc[0]
-    nextDf['is_elite'] = 1 if ovr >= 85 else 0
-    nextDf['is_good'] = 1 if 75 <= ovr < 85 else 0
-    nextDf['is_average'] = 1 if ovr < 75 else 0
-    
+    put('age_squared', age ** 2)
+    put('is_youth', age < 23)
+    put('is_prime', (age >= 23) & (age <= 29))
+    put('is_veteran', age > 29)
+
+    ovr = nextMatrix[:, COL['overall']]
+    put('is_elite', ovr >= 85)
+    put('is_good', (ovr >= 75) & (ovr < 85))
+    put('is_average', ovr < 75)
+
     # 6. Calculate momentum and trends
-    ratingChange = results.get('predictRatingChange', 0)
-    # Accumulate momentum with decay
-    currentMomentum = currentDf['rating_momentum'].iloc[0] if 'rating_momentum' in currentDf.columns else 0
-    # Apply 0.7 decay (30% fade per year)
-    decayedMomentum = currentMomentum * 0.7
-    newMomentum = decayedMomentum + ratingChange
-    # Light cap between -10 and +10
-    nextDf['rating_momentum'] = max(-10, min(10, newMomentum))
-    
+    ratingChange = result('predictRatingChange', 0)
+    # Accumulate momentum with 0.7 decay (30% fade per year), light cap between -10 and +10
+    put('rating_momentum', np.clip(cur('rating_momentum') * 0.7 + ratingChange, -10, 10))
+
     # Track last rating change to detect oscillation patterns
-    nextDf['last_rating_change'] = ratingChange
-    
-    # Goals trend: difference between current and lag
-    nextDf['goals_trend'] = nextDf['Per 90 Minutes_Gls'].iloc[0] - nextDf['Per 90 Minutes_Gls_lag1'].iloc[0]
-    
-    # Minutes trend: difference between current and lag
-    nextDf['minutes_trend'] = nextDf['Playing Time_Min'].iloc[0] - nextDf['Playing Time_Min_lag1'].iloc[0]
-    
+    put('last_rating_change', ratingChange)
+
+    # Goals / minutes trend: difference between current and lag
+    put('goals_trend', gls90 - nextMatrix[:, COL['Per 90 Minutes_Gls_lag1']])
+    put('minutes_trend', effectiveMinutes - nextMatrix[:, COL['Playing Time_Min_lag1']])
+
     # goals vs xG
-    if 'Per 90 Minutes_xG' in nextDf.columns:
-        nextDf['goals_vs_xG'] = nextDf['Per 90 Minutes_Gls'] - nextDf['Per 90 Minutes_xG']
-    else:
-        nextDf['goals_vs_xG'] = 0
-    
+    put('goals_vs_xG', gls90 - nextMatrix[:, COL['Per 90 Minutes_xG']])
+
     # Has prior season is now always True
-    nextDf['has_prior_season'] = 1
-    
-    # Keep wage/value zscore and percentile (or recalculate if you have the logic)
-    # For now, maintain existing values as they require full dataset context
-    
-    return nextDf
+    put('has_prior_season', 1)
+
+    # Keep wage/value zscore and percentile (they require full dataset context)
 
-def predictNineYears(dfStats, player=None):
+    return state.withMatrix(nextMatrix)
+
+def resultsToNextSeasonDf(currentDf, results):
+    """
+    Converts prediction results into a dataframe for the next season.
+    DataFrame wrapper around nextSeasonState for single-player callers.
+    """
+    state = SimulationState.fromFrame(currentDf)
+    seasonResults = {key: np.array([value], dtype=float) for key, value in results.items() if value is not None}
+    return nextSeasonState(state, seasonResults).toFrame()
+
+SIMULATED_YEARS = 9
+
+def predictNineYears(dfStats, player=None, yearOverrides=None):
     """
     Predict 9 years of player progression recursively.
     Returns a list of prediction results, one for each year.
+    - yearOverrides: optional {year: {feature: value}} applied to the inputs of
+      that simulated year (1-9); only the years from the first edit onward are
+      re-run, the earlier seasons come from the cached trajectory
+    Repeat calls with the same inputs are served from PREDICTION_CACHE.
     """
-    allPredictions = []
-    currentDf = dfStats.copy()
-    
-    # Store original potential for youth protection
-    original_potential = float(dfStats['potential'].iloc[0])
-    currentDf['original_potential'] = original_potential
-    
-    for year in range(9):
-        # Predict current season
-        results = predictStats(currentDf, player)
-        results['year'] = year + 1  # Year 1-9
-        allPredictions.append(results)
-        
-        # Prepare dataframe for next season (unless it's the last year)
-        if year < 8:
-            currentDf = resultsToNextSeasonDf(currentDf, results)
-    
-    return allPredictions
+    state = SimulationState.fromFrame(dfStats, [player])
+    trajectory = cachedTrajectory(predictionCacheKey('trajectory', state), state, yearOverrides or {})
+    return trajectoryLibraries(trajectory)[0]
+
+def cachedTrajectory(baseKey, state, yearOverrides):
+    """
+    Trajectory for `state` with per-year overrides, built on the cached
+    trajectory for every edit but the latest one, so each edit only re-runs
+    the seasons from its own year onward.
+    """
+    if not yearOverrides:
+        return PREDICTION_CACHE.get_or_compute(baseKey, lambda: simulateTrajectory(state))
+    for year in yearOverrides:
+        if not 1 <= year <= SIMULATED_YEARS:
+            raise ValueError(f"Override year {year} is outside 1-{SIMULATED_YEARS}")
+    lastYear = max(yearOverrides)
+    earlier = {year: values for year, values in yearOverrides.items() if year != lastYear}
+    key = content_key(baseKey, repr(sorted((year, sorted(values.items())) for year, values in yearOverrides.items())))
+    return PREDICTION_CACHE.get_or_compute(
+        key,
+        lambda: resumeTrajectory(cachedTrajectory(baseKey, state, earlier), lastYear, yearOverrides[lastYear]),
+    )
+
+def simulateTrajectory(state, years=SIMULATED_YEARS):
+    """Simulate `years` seasons from `state`, keeping every season's input state as a checkpoint"""
+    return runSeasons(SimulationTrajectory([], [], [], 0), state, years)
+
+def resumeTrajectory(trajectory, year, overrides=None):
+    """
+    New trajectory that shares seasons 1..year-1 with `trajectory` and re-runs
+    from `year` (1-based), with `overrides` applied to that year's inputs.
+    """
+    prefix = SimulationTrajectory(
+        trajectory.states[:year - 1],
+        trajectory.seasonResults[:year - 1],
+        trajectory.attributesRounded[:year - 1],
+        0,
+    )
+    state = trajectory.states[year - 1]
+    if overrides:
+        state = state.withOverrides(overrides)
+    return runSeasons(prefix, state, len(trajectory) - year + 1)
+
+def runSeasons(trajectory, state, years):
+    """Append `years` simulated seasons starting from `state` to `trajectory`"""
+    for _, seasonState, seasonResults, attributesRounded in iterSeasons(state, years):
+        trajectory.states.append(seasonState)
+        trajectory.seasonResults.append(seasonResults)
+        trajectory.attributesRounded.append(attributesRounded)
+        trajectory.seasonsRun += 1
+    return trajectory
+
+def iterSeasons(state, years=SIMULATED_YEARS, retirementAge=None, stopAtZeroMinutes=False, yearOverrides=None,
+                perturb=None):
+    """
+    Simulate up to `years` seasons, yielding each one as soon as it is computed:
+    (rows, state, seasonResults, attributesRounded), where rows are the indices
+    (into the starting state) of the players simulated that season.
+    - retirementAge: a player stops once the next season would be past this age
+    - stopAtZeroMinutes: a player stops after a season with no predicted minutes
+    - yearOverrides: {year: {feature: value}} applied before that season (1-based)
+    - perturb: passed to predictSeasonArrays every season
+    The next season is only prepared when the caller asks for it, so stopping
+    early (or a short horizon) costs nothing extra. Ends when no player is left.
+    """
+    rows = np.arange(len(state))
+    for season in range(years):
+        if yearOverrides and season + 1 in yearOverrides:
+            state = state.withOverrides(yearOverrides[season + 1])
+        seasonResults, attributesRounded = predictSeasonArrays(state, perturb)
+        yield rows, state, seasonResults, attributesRounded
+        # Prepare state for next season (unless it's the last year)
+        if season == years - 1:
+            return
+
+        finished = np.zeros(len(rows), dtype=bool)
+        if retirementAge is not None:
+            finished |= state.column('age_fifa') + 1 > retirementAge
+        if stopAtZeroMinutes and 'predictedMinutes' in seasonResults:
+            finished |= seasonResults['predictedMinutes'] <= 0
+        if finished.all():
+            return
+        if finished.any():
+            keep = ~finished
+            rows = rows[keep]
+            state = state.take(keep)
+            seasonResults = {key: values[keep] for key, values in seasonResults.items()}
+        state = nextSeasonState(state, seasonResults)
+
+def iterNineYears(dfStats, player=None, horizon=SIMULATED_YEARS, **options):
+    """
+    Generator version of predictNineYears for one player: yields each year's
+    result dict (with 'year') as soon as it is computed. Takes the same
+    horizon / early-termination options as iterSeasons.
+    """
+    state = SimulationState.fromFrame(dfStats, [player])
+    for year, (_, _, seasonResults, attributesRounded) in enumerate(iterSeasons(state, horizon, **options), 1):
+        results = resultsToDicts(seasonResults, attributesRounded)[0]
+        results['year'] = year
+        yield results
+
+def trajectoryLibraries(trajectory):
+    """One statsLibrary (list of per-year result dicts, year 1-9) per player"""
+    allLibraries = [[] for _ in range(len(trajectory.states[0]))]
+    for year, (seasonResults, attributesRounded) in enumerate(zip(trajectory.seasonResults, trajectory.attributesRounded)):
+        for library, results in zip(allLibraries, resultsToDicts(seasonResults, attributesRounded)):
+            results['year'] = year + 1  # Year 1-9
+            library.append(results)
+    return allLibraries
 
 
 # Feature 1 | Predict Current Season Stats
@@ -702,62 +1065,101 @@ def predictStats(dfStats, player=None):
     """
     Predict key stats for a player (dataframe from front-end) using the face stats models.
     Returns a json/dict of predicted stats.
+    Repeat calls with the same inputs are served from PREDICTION_CACHE.
     """
-    # Only pass model features to prediction functions
-    # Allows additional features to be used for 'fixing'
-    model_features = [
-        'age_fifa', 'overall', 'potential', 'pace', 'shooting', 'passing',
-        'dribbling', 'defending', 'physic', 'Playing Time_Min',
-        'Playing Time_90s', 'Per 90 Minutes_Gls', 'Per 90 Minutes_Ast',
-        'Per 90 Minutes_G+A', 'Per 90 Minutes_G-PK', 'Per 90 Minutes_xG',
-        'Per 90 Minutes_xAG', 'Standard_Sh/90', 'Standard_SoT%', 'Total_Cmp%',
-        'Per 90 Minutes_KP', 'Per 90 Minutes_PrgP',
-        'Per 90 Minutes_Tackles_Tkl', 'Per 90 Minutes_Int', 'SCA_SCA90',
-        'age_squared', 'is_youth', 'is_prime', 'is_veteran', 'is_elite',
-        'is_good', 'is_average', 'wage_zscore', 'wage_percentile',
-        'value_zscore', 'goals_vs_xG', 'is_forward', 'is_midfield',
-        'is_defense', 'overall_lag1', 'age_lag1', 'Playing Time_Min_lag1',
-        'Per 90 Minutes_Gls_lag1', 'Per 90 Minutes_Ast_lag1',
-        'Per 90 Minutes_G+A_lag1', 'Per 90 Minutes_xG_lag1', 'value_eur_lag1',
-        'has_prior_season', 'rating_momentum', 'goals_trend', 'minutes_trend'
-    ]
-    df_model = dfStats[model_features].copy()
-
-    tasks = [
-        predictPace,
-        predictShooting,
-        predictPassing,
-        predictDribbling,
-        predictPhysic,
-        predictDefending,
-        predictRatingChange,
-        predictOverall,
-        predictValue,
-        predictPotential,
-        predictG90,
-        predictA90,
-        predictInt90,
-        predictTkl90,
-        predictMin,
-        predictKey90        
+    state = SimulationState.fromFrame(dfStats, [player])
+    results = PREDICTION_CACHE.get_or_compute(
+        predictionCacheKey('predictStats', state),
+        lambda: predictStatsState(state)[0],
+    )
+    return dict(results)
+
+def predictionCacheKey(kind, state):
+    """
+    Content hash of everything a single-player simulation depends on: the
+    state matrix (model features plus value/potential helpers), where the
+    value came from, the position fields and the model bundle fingerprint.
+    """
+    _checkModelFiles()
+    return content_key(
+        kind,
+        bundleFingerprint(),
+        state.matrix.tobytes(),
+        state.value_known.tobytes(),
+        "\x1f".join(str(p) for p in state.pos),
+        "\x1f".join(str(p) for p in state.player_positions),
+    )
+
+def inputFingerprints(dfStats, players=None):
+    """
+    Per-player fingerprint of the simulation inputs (the fields predictionCacheKey
+    hashes, without the models). Stored with precomputed predictions so rows
+    whose player data changed can be found and recomputed.
+    """
+    state = SimulationState.fromFrame(dfStats, players)
+    return [
+        content_key(state.matrix[i].tobytes(), state.value_known[i:i + 1].tobytes(),
+                    str(state.pos[i]), str(state.player_positions[i]))[:16]
+        for i in range(len(state))
     ]
 
-    results = {}
-    # Run tasks in parallel
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futureToTask = {executor.submit(task, df_model): task.__name__ for task in tasks}
-        for future in concurrent.futures.as_completed(futureToTask):
-            task_name = futureToTask[future]
-            try:
-                result = future.result()
-                # Convert numpy types to Python native types for JSON serialization
-                results[task_name] = float(result) if result is not None else None
-            except Exception as e:
-                results[task_name] = None
-                print(f"Error in {task_name}: {e}")
+def predictStatsState(state):
+    """
+    Predict one season for every player in a SimulationState.
+    Returns a list of result dicts in row order.
+    """
+    return resultsToDicts(*predictSeasonArrays(state))
+
+# Optional StageTimer (see stage_timer.py) that batch jobs install to see where
+# simulation time goes: model inference, the rule layer and building result dicts
+stageTimer = None
+
+def setStageTimer(timer):
+    global stageTimer
+    stageTimer = timer
+
+def timedStage(name):
+    return stageTimer.stage(name) if stageTimer is not None else contextlib.nullcontext()
+
+def predictSeasonArrays(state, perturb=None):
+    """
+    Run every model once over all players, then the vectorized rule layer.
+    `perturb` optionally rewrites the rule-adjusted results (see residualNoise).
+    Returns ({result key: array}, mask of players whose face stats were rounded).
+    """
+    with timedStage('inference'):
+        predictions = runModels(state.modelMatrix())
+    with timedStage('rules'):
+        seasonResults, attributesRounded = applyPredictionRulesBatch(predictions, state)
+    if perturb is not None:
+        seasonResults = perturb(seasonResults)
+    return seasonResults, attributesRounded
+
+def resultsToDicts(seasonResults, attributesRounded):
+    """Split season result arrays into one JSON-ready dict per player"""
+    keys = list(seasonResults)
+    columns = []
+    for key in keys:
+        values = seasonResults[key].tolist()
+        if key in ATTRIBUTE_KEYS:
+            # FixAttributes rounds the face stats it adjusts to whole numbers
+            values = [int(v) if rounded else v for v, rounded in zip(values, attributesRounded)]
+        # Failed models come through as NaN
+        columns.append([None if v != v else v for v in values])
+    return [dict(zip(keys, row)) for row in zip(*columns)]
+
+
+def applyPredictionRules(results, row, player=None):
+    """
+    Post-prediction adjustments for one player-season.
+    `results` holds the raw model outputs keyed by task name, `row` the input
+    features (plus 'pos' and any helper columns) as a dict of scalars.
+    Reference implementation for prediction_rules.applyPredictionRulesBatch,
+    which the simulation uses (see check_rules.py).
+    """
     # Change per 90 to normal stats where applicable
     try:
-        playing_time_min = dfStats['Playing Time_Min'].iloc[0]
+        playing_time_min = row['Playing Time_Min']
         playing_time_min = float(playing_time_min) if playing_time_min is not None else 0.0
     except:
         playing_time_min = 0.0
@@ -770,14 +1172,14 @@ def predictStats(dfStats, player=None):
     key90 = results.pop('predictKey90', None)
     
     # Get position and rating for minimum G/A enforcement
-    position = dfStats['pos'].iloc[0] if 'pos' in dfStats.columns else ''
-    player_positions = dfStats['player_positions'].iloc[0] if 'player_positions' in dfStats.columns else ''
+    position = row['pos'] if 'pos' in row else ''
+    player_positions = row['player_positions'] if 'player_positions' in row else ''
     
     # Also check player object for position data (fallback)
     if player is not None and not player_positions:
         player_positions = getattr(player, 'player_positions', '') or ''
     
-    current_overall = float(dfStats['overall'].iloc[0])
+    current_overall = float(row['overall'])
     
     # Use ML predictions
     g90_ml = float(g90) if g90 is not None else 0.0
@@ -834,7 +1236,7 @@ def predictStats(dfStats, player=None):
     
     # Age-based G/A adjustments (creates natural career arc)
     # Apply BEFORE floor logic so floors represent minimum at any age
-    age = int(dfStats['age_fifa'].iloc[0]) if 'age_fifa' in dfStats.columns else 25
+    age = int(row['age_fifa']) if 'age_fifa' in row else 25
     
     age_multiplier = 1.0
     if is_forward or is_winger or is_attacking_mid or is_midfielder:
@@ -929,16 +1331,14 @@ def predictStats(dfStats, player=None):
 
     # POST PREDICTION ADJUSTMENTS
 
-    momentum = float(dfStats['rating_momentum'].iloc[0])
+    momentum = float(row['rating_momentum'])
     ratingChange_val = results.get('predictRatingChange')
     ratingChange = float(ratingChange_val) if ratingChange_val is not None else 0.0  # actual predicted
-    current_overall = float(math.ceil(float(dfStats['overall'].iloc[0])))        
+    current_overall = float(math.ceil(float(row['overall'])))        
     
     # Get age and potential for youth player boost
-    age_fifa_val = int(dfStats['age_fifa'].iloc[0])
-    original_potential = dfStats.get('original_potential', dfStats['potential'].iloc[0])
-    if isinstance(original_potential, pd.Series):
-        original_potential = original_potential.iloc[0]
+    age_fifa_val = int(row['age_fifa'])
+    original_potential = row.get('original_potential', row['potential'])
     player_potential = float(original_potential)
     
     if momentum > 10:
@@ -952,15 +1352,118 @@ def predictStats(dfStats, player=None):
     
      # value fix | For old players and improper increase/decrease
     # Use value from dataframe (which gets updated each year) instead of player object
-    player_value_eur = dfStats['value_eur'].iloc[0] if 'value_eur' in dfStats.columns else (getattr(player, 'value_eur', None) if player else None)
-    age_fifa_val = int(dfStats['age_fifa'].iloc[0])
-    current_overall_for_value = float(dfStats['overall'].iloc[0])
+    player_value_eur = row['value_eur'] if 'value_eur' in row else (getattr(player, 'value_eur', None) if player else None)
+    age_fifa_val = int(row['age_fifa'])
+    current_overall_for_value = float(row['overall'])
     predictedValueEur = int(results.get('predictValue'))
     results['predictValue'] = FixValue(age_fifa_val, player_value_eur, results['predictRatingChange'], predictedValueEur, current_overall_for_value)
 
     # Attribute fix | update dfStats with fixed attributes after predictions
-    position = dfStats['pos'].iloc[0]
+    position = row['pos']
     results = FixAttributes(results, position)
     
     
-    return results
\ No newline at end of file
+    return results
+
+
+# Batch simulation | many players per model call
+def predictStatsBatch(dfStats, players=None):
+    """
+    Batch version of predictStats for an N-row dataframe (one row per player).
+    `players` is an optional list of Player objects aligned with the rows.
+    Returns a list of result dicts in row order.
+    """
+    return predictStatsState(SimulationState.fromFrame(dfStats, players))
+
+def predictNineYearsBatch(dfStats, players=None, horizon=SIMULATED_YEARS, **options):
+    """
+    Predict 9 years (or `horizon` years) of progression for every row of dfStats at once.
+    Each model is called once per simulated season over all players still simulated.
+    Takes the early-termination options of iterSeasons; stopped players get shorter lists.
+    Returns a list of statsLibrary lists in row order.
+    """
+    state = SimulationState.fromFrame(dfStats, players)
+    allLibraries = [[] for _ in range(len(state))]
+    for year, (rows, _, seasonResults, attributesRounded) in enumerate(iterSeasons(state, horizon, **options), 1):
+        with timedStage('serialize'):
+            for row, results in zip(rows, resultsToDicts(seasonResults, attributesRounded)):
+                results['year'] = year
+                allLibraries[row].append(results)
+    return allLibraries
+
+
+# Monte Carlo | uncertainty bands from perturbed rollouts
+BAND_PERCENTILES = (10, 50, 90)
+
+# Rule outputs perturbed by residualNoise
+RATING_RESULTS = ['predictPace', 'predictShooting', 'predictPassing', 'predictDribbling', 'predictPhysic',
+                  'predictDefending', 'predictedPotential']
+MINUTE_RESULTS = ['predictMin', 'predictedMinutes']
+TOTAL_RESULTS = ['predictedGoals', 'predictedAssists', 'predictedInterceptions', 'predictedTackles',
+                 'predictedKeyPasses']
+
+def residualNoise(rng, ratingSd, valueSd, statsSd):
+    """
+    Perturbation for predictSeasonArrays, applied to the rule-adjusted season
+    results, which are also what the next season starts from. Noise on the raw
+    model outputs mostly disappears in the rules (FixOverall and FixValue clamp
+    many players to a fixed change), so the bands would collapse.
+    - overall: a whole number of rating points per row (normal, sd ratingSd,
+      rounded so the next season's ceil() doesn't bias it upwards); the
+      rating change moves with it
+    - face stats and potential: the overall's draw plus their own (sd ratingSd / 2)
+    - value: log-normal (sd valueSd on the log scale)
+    - minutes and season totals: log-normal (sd statsSd); totals also scale
+      with the minutes draw
+    Ratings stay within 1-99.
+    """
+    def perturb(results):
+        results = dict(results)
+        rows = len(results['predictOverall'])
+        ratingNoise = np.rint(rng.normal(0.0, ratingSd, rows))
+        results['predictOverall'] = np.clip(results['predictOverall'] + ratingNoise, 1, 99)
+        if 'predictRatingChange' in results:
+            results['predictRatingChange'] = results['predictRatingChange'] + ratingNoise
+        for key in RATING_RESULTS:
+            if key in results:
+                results[key] = np.clip(results[key] + ratingNoise + rng.normal(0.0, ratingSd / 2, rows), 1, 99)
+        results['predictValue'] = results['predictValue'] * np.exp(rng.normal(0.0, valueSd, rows))
+        minutesScale = np.exp(rng.normal(0.0, statsSd, rows))
+        for key in MINUTE_RESULTS:
+            if key in results:
+                results[key] = results[key] * minutesScale
+        for key in TOTAL_RESULTS:
+            if key in results:
+                results[key] = results[key] * minutesScale * np.exp(rng.normal(0.0, statsSd, rows))
+        return results
+    return perturb
+
+def predictUncertaintyBands(dfStats, players=None, samples=100, horizon=SIMULATED_YEARS, seed=None,
+                            yearOverrides=None):
+    """
+    Run `samples` perturbed rollouts per player and summarize every metric per
+    year as p10/p50/p90. All samples x players rows go through each season as
+    one batch, so every model still runs once per season.
+    Returns, per player, a list of {'year': n, metric: {'p10', 'p50', 'p90'}}.
+    """
+    state = SimulationState.fromFrame(dfStats, players)
+    n = len(state)
+    # Sample-major: rows k*n .. k*n + n - 1 are rollout k of every player
+    rollouts = state.take(np.tile(np.arange(n), samples))
+    perturb = residualNoise(np.random.default_rng(seed), settings.MONTE_CARLO_RATING_SD,
+                            settings.MONTE_CARLO_VALUE_SD, settings.MONTE_CARLO_STATS_SD)
+
+    allBands = [[] for _ in range(n)]
+    seasons = iterSeasons(rollouts, horizon, yearOverrides=yearOverrides, perturb=perturb)
+    for year, (_, _, seasonResults, _) in enumerate(seasons, 1):
+        yearBands = [{'year': year} for _ in range(n)]
+        for key, values in seasonResults.items():
+            with warnings.catch_warnings():
+                # Metrics whose model failed are NaN in every sample
+                warnings.simplefilter('ignore', RuntimeWarning)
+                bands = np.nanpercentile(np.asarray(values, dtype=float).reshape(samples, n), BAND_PERCENTILES, axis=0)
+            for i in range(n):
+                yearBands[i][key] = {f'p{q}': (None if v != v else float(v)) for q, v in zip(BAND_PERCENTILES, bands[:, i])}
+        for playerBands, bands in zip(allBands, yearBands):
+            playerBands.append(bands)
+    return allBands
@@ -0,0 +1,180 @@
+"""
+Live what-if simulations for the API.
+Builds a feature row from a stored player plus overridden values (or from a
+full custom feature payload), runs the nine-year simulation on a dedicated
+executor so request-serving threads stay free, and keeps latency samples
+for every stage of a request.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import json
+import math
+import threading
+import time
+import numpy as np
+import pandas as pd
+from config import settings
+from model_utils import player_to_features, MODEL_FEATURES, DB_TO_MODEL_MAPPING
+from predictor import predictNineYears, iterNineYears, predictUncertaintyBands
+from simulation_state import EDITABLE_COLUMNS
+
+# Values a request may set: model features plus the market value the value
+# rules start from. Database column names (gls_per90, ...) are accepted too.
+SIMULATION_INPUTS = EDITABLE_COLUMNS
+STAGES = ('load', 'features', 'simulate', 'total')
+
+
+class LatencyTracker:
+    """
+    Rolling window of request latencies (ms) per stage, with percentiles and,
+    if `p95_target_ms` is given, whether the total p95 is within it.
+    """
+
+    def __init__(self, window=1000, p95_target_ms=None):
+        self._samples = {stage: collections.deque(maxlen=window) for stage in STAGES}
+        self._lock = threading.Lock()
+        self.p95_target_ms = p95_target_ms
+
+    def record(self, timings):
+        with self._lock:
+            for stage, ms in timings.items():
+                self._samples[stage].append(ms)
+
+    def summary(self):
+        with self._lock:
+            samples = {stage: np.array(values) for stage, values in self._samples.items()}
+        stages = {}
+        for stage, values in samples.items():
+            if len(values) == 0:
+                stages[stage] = {'count': 0}
+                continue
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            stages[stage] = {
+                'count': len(values),
+                'p50_ms': round(float(p50), 2),
+                'p95_ms': round(float(p95), 2),
+                'p99_ms': round(float(p99), 2),
+                'max_ms': round(float(values.max()), 2),
+            }
+        if self.p95_target_ms is None:
+            return {'stages': stages}
+        total_p95 = stages['total'].get('p95_ms')
+        return {
+            'p95_target_ms': self.p95_target_ms,
+            'within_target': total_p95 <= self.p95_target_ms if total_p95 is not None else None,
+            'stages': stages,
+        }
+
+
+# Deterministic simulations, checked against the p95 target. Requests with
+# Monte Carlo samples run the simulation `samples` more times, so they are
+# tracked on their own instead of counting against the target.
+LATENCY = LatencyTracker(p95_target_ms=settings.SIMULATION_P95_TARGET_MS)
+MONTE_CARLO_LATENCY = LatencyTracker()
+
+_executor = None
+_executorLock = threading.Lock()
+
+
+def get_simulation_executor():
+    """Thread pool the simulations run on, separate from the inference pool it feeds"""
+    global _executor
+    with _executorLock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=settings.SIMULATION_WORKERS,
+                thread_name_prefix='simulation',
+            )
+        return _executor
+
+
+def normalize_inputs(values):
+    """Map request keys (model or database names) to SIMULATION_INPUTS names; raises ValueError on bad input"""
+    normalized = {}
+    unknown = []
+    for key, value in values.items():
+        name = key if key in SIMULATION_INPUTS else DB_TO_MODEL_MAPPING.get(key)
+        if name is None:
+            unknown.append(key)
+            continue
+        value = float(value)
+        if not math.isfinite(value):
+            raise ValueError(f"Feature '{key}' must be a finite number")
+        normalized[name] = value
+    if unknown:
+        raise ValueError(f"Unknown features: {sorted(unknown)}")
+    return normalized
+
+
+def normalize_year_overrides(year_overrides):
+    """{year: {key: value}} with keys normalized like normalize_inputs"""
+    return {int(year): normalize_inputs(values) for year, values in (year_overrides or {}).items() if values}
+
+
+def build_features(player=None, features=None, overrides=None, pos=None, player_positions=None):
+    """
+    One-row feature DataFrame for predictNineYears.
+    - player: stored Player to start from (its features, position and value)
+    - features: full custom payload with every model feature, used instead of a player
+    - overrides: values replacing individual features
+    - pos / player_positions: position strings (default to the player's)
+    """
+    if features is not None:
+        values = normalize_inputs(features)
+        missing = [name for name in MODEL_FEATURES if name not in values]
+        if missing:
+            raise ValueError(f"Custom features are missing {missing}")
+        dfStats = pd.DataFrame([{name: values[name] for name in SIMULATION_INPUTS if name in values}])
+    elif player is not None:
+        dfStats = player_to_features(player)
+    else:
+        raise ValueError("Provide a player_id or a full set of features")
+
+    for name, value in normalize_inputs(overrides or {}).items():
+        dfStats[name] = value
+    if player is None and 'value_eur' not in dfStats.columns:
+        raise ValueError("value_eur is required when simulating custom features")
+
+    if pos is not None or 'pos' not in dfStats.columns:
+        dfStats['pos'] = pos or ''
+    if player_positions is not None:
+        dfStats['player_positions'] = player_positions
+    return dfStats
+
+
+def run_simulation(dfStats, player=None, yearOverrides=None, samples=0, seed=None):
+    """
+    Run the nine-year simulation, returning (statsLibrary, bands, elapsed ms).
+    bands is None unless samples > 0 (see predictor.predictUncertaintyBands).
+    """
+    start = time.perf_counter()
+    statsLibrary = predictNineYears(dfStats, player, yearOverrides)
+    bands = None
+    if samples:
+        bands = predictUncertaintyBands(dfStats, [player], samples, seed=seed, yearOverrides=yearOverrides)[0]
+    return statsLibrary, bands, (time.perf_counter() - start) * 1000
+
+
+async def simulate(dfStats, player=None, yearOverrides=None, samples=0, seed=None):
+    """Run the simulation on the simulation executor without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_simulation_executor(), run_simulation, dfStats, player, yearOverrides, samples, seed
+    )
+
+
+async def stream_simulation(dfStats, player=None, horizon=9, **options):
+    """
+    NDJSON lines, one per simulated year, produced as the seasons are computed.
+    Each season runs on the simulation executor; the event loop only relays results.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_simulation_executor()
+    seasons = iterNineYears(dfStats, player, horizon, **options)
+    done = object()
+    while True:
+        results = await loop.run_in_executor(executor, next, seasons, done)
+        if results is done:
+            return
+        yield json.dumps(results) + "\n"
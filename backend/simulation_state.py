@@ -0,0 +1,144 @@
+"""
+Array-backed state for the recursive season simulation.
+Replaces the per-season DataFrame copies with one float64 matrix per season.
+"""
+import math
+import numpy as np
+import pandas as pd
+from model_utils import MODEL_FEATURES
+from prediction_rules import positionGroups
+
+# Model features first so the model input is a plain column slice,
+# followed by the helper values the post-prediction rules need
+STATE_COLUMNS = MODEL_FEATURES + ['value_eur', 'original_potential', 'last_rating_change']
+COL = {name: i for i, name in enumerate(STATE_COLUMNS)}
+NUM_MODEL_FEATURES = len(MODEL_FEATURES)
+# Columns a caller may override before a season is simulated
+EDITABLE_COLUMNS = MODEL_FEATURES + ['value_eur']
+
+
+class SimulationState:
+    """
+    One simulated season for N players.
+    - matrix: N x len(STATE_COLUMNS) float64, columns indexed through COL
+    - pos / player_positions: position strings per player
+    - position_groups: G/A position group per player (see prediction_rules)
+    - players: Player objects (or None) aligned with the rows
+    - value_known: False where value_eur came from the Player object rather
+      than the feature frame (only true for the first season)
+    """
+    __slots__ = ('matrix', 'pos', 'player_positions', 'position_groups', 'players', 'value_known')
+
+    def __init__(self, matrix, pos, player_positions, position_groups, players, value_known):
+        self.matrix = matrix
+        self.pos = pos
+        self.player_positions = player_positions
+        self.position_groups = position_groups
+        self.players = players
+        self.value_known = value_known
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @classmethod
+    def fromFrame(cls, dfStats, players=None):
+        """Build the state from a feature DataFrame (one row per player)"""
+        n = len(dfStats)
+        players = list(players) if players is not None else [None] * n
+        columns = dfStats.columns
+
+        matrix = np.zeros((n, len(STATE_COLUMNS)))
+        matrix[:, :NUM_MODEL_FEATURES] = dfStats[MODEL_FEATURES].to_numpy(dtype=float)
+
+        if 'value_eur' in columns:
+            matrix[:, COL['value_eur']] = dfStats['value_eur'].to_numpy(dtype=float)
+            value_known = np.ones(n, dtype=bool)
+        else:
+            # Features from player_to_features carry no value_eur, use the Player object
+            values = [getattr(p, 'value_eur', None) if p is not None else None for p in players]
+            matrix[:, COL['value_eur']] = [v if v is not None else np.nan for v in values]
+            value_known = np.zeros(n, dtype=bool)
+
+        source = 'original_potential' if 'original_potential' in columns else 'potential'
+        matrix[:, COL['original_potential']] = dfStats[source].to_numpy(dtype=float)
+        if 'last_rating_change' in columns:
+            matrix[:, COL['last_rating_change']] = dfStats['last_rating_change'].to_numpy(dtype=float)
+
+        pos = list(dfStats['pos']) if 'pos' in columns else [''] * n
+        positions = list(dfStats['player_positions']) if 'player_positions' in columns else [''] * n
+        for i, player in enumerate(players):
+            # Fall back to the player object for position data
+            if player is not None and not positions[i]:
+                positions[i] = getattr(player, 'player_positions', '') or ''
+
+        return cls(matrix, pos, positions, positionGroups(pos, positions), players, value_known)
+
+    def withMatrix(self, matrix):
+        """Next season's state: new values, same players (value_eur now comes from the features)"""
+        return SimulationState(matrix, self.pos, self.player_positions, self.position_groups,
+                               self.players, np.ones(len(matrix), dtype=bool))
+
+    def withOverrides(self, overrides):
+        """Copy of this state with {column: value} applied to every player (EDITABLE_COLUMNS only)"""
+        unknown = [name for name in overrides if name not in EDITABLE_COLUMNS]
+        if unknown:
+            raise ValueError(f"Cannot override {unknown}")
+        matrix = self.matrix.copy()
+        for name, value in overrides.items():
+            matrix[:, COL[name]] = value
+        value_known = np.ones(len(matrix), dtype=bool) if 'value_eur' in overrides else self.value_known
+        return SimulationState(matrix, self.pos, self.player_positions, self.position_groups,
+                               self.players, value_known)
+
+    def take(self, rows):
+        """State for a subset of players (row indices or a boolean mask), e.g. those still simulated"""
+        rows = np.flatnonzero(rows) if np.asarray(rows).dtype == bool else np.asarray(rows)
+        return SimulationState(self.matrix[rows], [self.pos[i] for i in rows],
+                               [self.player_positions[i] for i in rows], self.position_groups[rows],
+                               [self.players[i] for i in rows], self.value_known[rows])
+
+    def column(self, name):
+        """View of one column across all players"""
+        return self.matrix[:, COL[name]]
+
+    def modelMatrix(self):
+        """Model features as one float32, C-contiguous array"""
+        return np.ascontiguousarray(self.matrix[:, :NUM_MODEL_FEATURES], dtype=np.float32)
+
+    def rowDicts(self):
+        """Per-player dicts of feature name -> value for the scalar rule functions"""
+        rows = []
+        for i, values in enumerate(self.matrix.tolist()):
+            row = dict(zip(STATE_COLUMNS, values))
+            if math.isnan(row['value_eur']):
+                row['value_eur'] = None
+            row['pos'] = self.pos[i]
+            row['player_positions'] = self.player_positions[i]
+            rows.append(row)
+        return rows
+
+    def toFrame(self):
+        """DataFrame view of the state (for inspection and the DataFrame APIs)"""
+        df = pd.DataFrame(self.matrix, columns=STATE_COLUMNS)
+        df['pos'] = self.pos
+        df['player_positions'] = self.player_positions
+        return df
+
+
+class SimulationTrajectory:
+    """
+    Checkpoints of a multi-season simulation.
+    - states[i]: the state season i + 1 was predicted from
+    - seasonResults[i] / attributesRounded[i]: that season's rule-adjusted results
+    - seasonsRun: seasons actually simulated to build it (the rest came from a reused prefix)
+    """
+    __slots__ = ('states', 'seasonResults', 'attributesRounded', 'seasonsRun')
+
+    def __init__(self, states, seasonResults, attributesRounded, seasonsRun):
+        self.states = states
+        self.seasonResults = seasonResults
+        self.attributesRounded = attributesRounded
+        self.seasonsRun = seasonsRun
+
+    def __len__(self):
+        return len(self.states)
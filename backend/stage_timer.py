@@ -0,0 +1,74 @@
+"""
+Wall-clock timers per named stage, for batch jobs.
+Code wraps each step in `with timer.stage(name)`. Stages may nest: time
+spent in an inner stage is not counted again in the outer one, so the
+stage totals add up to the time measured.
+"""
+import contextlib
+import time
+import numpy as np
+
+
+class StageTimer:
+    def __init__(self):
+        self.totals = {}   # stage -> ms, exclusive of nested stages
+        self._stack = []   # [name, started, ms spent in nested stages]
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        frame = [name, time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = (time.perf_counter() - frame[1]) * 1000
+            self.totals[name] = self.totals.get(name, 0.0) + elapsed - frame[2]
+            if self._stack:
+                self._stack[-1][2] += elapsed
+
+    def take(self):
+        """Return the totals since the last take() and start over"""
+        totals, self.totals = self.totals, {}
+        return totals
+
+
+def percentiles(values, points=(50, 95, 99)):
+    """{'p50': ..., ...} of a list of numbers (empty dict for no values)"""
+    if not values:
+        return {}
+    return {f"p{p}": round(float(v), 3) for p, v in zip(points, np.percentile(values, points))}
+
+
+def summarize_batches(batches):
+    """
+    Aggregate per-batch records ({'players': n, 'stages': {stage: ms}}):
+    per stage the total, share of all stage time and per-batch percentiles,
+    plus percentiles of whole-batch and per-player time.
+    """
+    totals = {}
+    per_stage = {}
+    batch_ms = []
+    player_ms = []
+    for batch in batches:
+        ms = sum(batch['stages'].values())
+        batch_ms.append(ms)
+        if batch['players']:
+            player_ms.append(ms / batch['players'])
+        for name, value in batch['stages'].items():
+            totals[name] = totals.get(name, 0.0) + value
+            per_stage.setdefault(name, []).append(value)
+    overall = sum(totals.values())
+    return {
+        'batches': len(batches),
+        'batch_ms': percentiles(batch_ms),
+        'player_ms': percentiles(player_ms),
+        'stages': {
+            name: {
+                'total_s': round(totals[name] / 1000, 3),
+                'share': round(totals[name] / overall, 4) if overall else None,
+                'batch_ms': percentiles(per_stage[name]),
+            }
+            for name in sorted(totals, key=totals.get, reverse=True)
+        },
+    }